@@ -1,19 +1,65 @@
 # services/api.py
 import os
 import sys
+import threading
+import time
 
 # 添加项目根目录到 Python 路径
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
+# 仓库根目录：与 http.server 后台共用的 schema_catalog
+sys.path.insert(0, os.path.dirname(project_root))
 
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from database.session import OLTPSession
+from database.session import OLTPSession, db_path
+from schema_catalog import get_schema_catalog
 from sqlalchemy import text
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
+# 表结构走共享的 schema_catalog（schema_version 变化才重新加载），总数带 TTL 缓存
+USER_COUNT_TTL = 60
+schema = get_schema_catalog(db_path)
+_user_count_lock = threading.Lock()
+_user_count = {'value': None, 'max_id': None, 'expires': 0.0}
+
+
+def get_users_columns(session):
+    """users 表的列名（每次只多一条 PRAGMA schema_version）"""
+    return schema.column_names(lambda sql: session.execute(text(sql)).fetchall(), 'users')
+
+
+def user_select_columns(session):
+    """(SELECT 列表, 输出字段名)：有 email 列时带上 email"""
+    if 'email' in get_users_columns(session):
+        fields = ['user_id', 'username', 'email', 'registration_date', 'province', 'city']
+    else:
+        fields = ['user_id', 'username', 'registration_date', 'province', 'city']
+    return ', '.join(fields), fields
+
+
+def user_to_dict(row, fields):
+    user = dict(zip(fields, row))
+    if user['registration_date']:
+        user['registration_date'] = user['registration_date'].isoformat()
+    return user
+
+
+def get_user_count(session):
+    """缓存的用户总数：TTL 内复用；MAX(user_id) 变化（有新用户写入）时立即重算，
+    删除用户则最多延迟 USER_COUNT_TTL 秒反映"""
+    max_id = session.execute(text("SELECT MAX(user_id) FROM users")).scalar()
+    now = time.monotonic()
+    with _user_count_lock:
+        if _user_count['value'] is not None and _user_count['max_id'] == max_id and now < _user_count['expires']:
+            return _user_count['value']
+    total = session.execute(text("SELECT COUNT(*) FROM users")).scalar()
+    with _user_count_lock:
+        _user_count.update(value=total, max_id=max_id, expires=now + USER_COUNT_TTL)
+    return total
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy", "service": "Ecommerce Backend API"})
@@ -22,39 +68,14 @@ def health_check():
 def get_user(user_id):
     session = OLTPSession()
     try:
-        # 先检查 users 表是否有 email 列
+        columns, fields = user_select_columns(session)
         result = session.execute(
-            text("PRAGMA table_info(users)")
+            text(f"SELECT {columns} FROM users WHERE user_id = :user_id"), {'user_id': user_id}
         )
-        columns = [row[1] for row in result]
-        has_email = 'email' in columns
-        
-        if has_email:
-            query = text("SELECT user_id, username, email, registration_date, province, city FROM users WHERE user_id = :user_id")
-        else:
-            query = text("SELECT user_id, username, registration_date, province, city FROM users WHERE user_id = :user_id")
-        
-        result = session.execute(query, {'user_id': user_id})
         user = result.fetchone()
-        
+
         if user:
-            if has_email:
-                return jsonify({
-                    'user_id': user[0],
-                    'username': user[1],
-                    'email': user[2],
-                    'registration_date': user[3].isoformat() if user[3] else None,
-                    'province': user[4],
-                    'city': user[5]
-                })
-            else:
-                return jsonify({
-                    'user_id': user[0],
-                    'username': user[1],
-                    'registration_date': user[2].isoformat() if user[2] else None,
-                    'province': user[3],
-                    'city': user[4]
-                })
+            return jsonify(user_to_dict(user, fields))
         else:
             return jsonify({'error': 'User not found'}), 404
             
@@ -65,67 +86,54 @@ def get_user(user_id):
 
 @app.route('/api/users', methods=['GET'])
 def get_users():
-    """获取用户列表"""
+    """获取用户列表
+
+    推荐用 after=<上一页最后一个 user_id> 翻页（按主键续扫，深翻页耗时不变）；
+    page= 仍然支持，但走 OFFSET，页数越靠后越慢。
+    """
     session = OLTPSession()
     try:
+        per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+        after = request.args.get('after', type=int)
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        offset = (page - 1) * per_page
-        
-        # 检查表结构
-        result = session.execute(text("PRAGMA table_info(users)"))
-        columns = [row[1] for row in result]
-        has_email = 'email' in columns
-        
-        if has_email:
-            query = text("""
-                SELECT user_id, username, email, registration_date, province, city 
+        columns, fields = user_select_columns(session)
+
+        if after is not None:
+            query = text(f"""
+                SELECT {columns}
                 FROM users 
+                WHERE user_id > :after
                 ORDER BY user_id 
-                LIMIT :limit OFFSET :offset
+                LIMIT :limit
             """)
+            params = {'after': after, 'limit': per_page + 1}
         else:
-            query = text("""
-                SELECT user_id, username, registration_date, province, city 
+            query = text(f"""
+                SELECT {columns}
                 FROM users 
                 ORDER BY user_id 
                 LIMIT :limit OFFSET :offset
             """)
-        
-        result = session.execute(query, {'limit': per_page, 'offset': offset})
-        users = []
-        
-        for row in result:
-            if has_email:
-                users.append({
-                    'user_id': row[0],
-                    'username': row[1],
-                    'email': row[2],
-                    'registration_date': row[3].isoformat() if row[3] else None,
-                    'province': row[4],
-                    'city': row[5]
-                })
-            else:
-                users.append({
-                    'user_id': row[0],
-                    'username': row[1],
-                    'registration_date': row[2].isoformat() if row[2] else None,
-                    'province': row[3],
-                    'city': row[4]
-                })
-        
-        # 获取总数
-        count_result = session.execute(text("SELECT COUNT(*) FROM users"))
-        total = count_result.scalar()
-        
+            params = {'limit': per_page + 1, 'offset': (page - 1) * per_page}
+
+        rows = session.execute(query, params).fetchall()
+        # 多取一行判断是否还有下一页
+        has_more = len(rows) > per_page
+        users = [user_to_dict(row, fields) for row in rows[:per_page]]
+
+        total = get_user_count(session)
+        pagination = {
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page,
+            'next_after': users[-1]['user_id'] if has_more else None
+        }
+        if after is None:
+            pagination['page'] = page
+
         return jsonify({
             'users': users,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
-            }
+            'pagination': pagination
         })
         
     except Exception as e:
@@ -172,8 +180,7 @@ def get_dashboard_stats():
     session = OLTPSession()
     try:
         # 用户总数
-        user_result = session.execute(text("SELECT COUNT(*) FROM users"))
-        total_users = user_result.scalar()
+        total_users = get_user_count(session)
         
         # 商品总数
         product_result = session.execute(text("SELECT COUNT(*) FROM products"))
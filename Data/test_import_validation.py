@@ -0,0 +1,190 @@
+# test_import_validation.py
+"""CSV 导入回归测试：日期格式、外键、N.0 形式的主键、upsert 计数与日汇总增量重算。
+
+    python Data/test_import_validation.py
+    python -m pytest Data/test_import_validation.py
+"""
+import importlib.util
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_app():
+    """Import ``import mysql2.py`` (the file name is not a valid module name)."""
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    spec = importlib.util.spec_from_file_location("dashboard_app", ROOT / "import mysql2.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+app = load_app()
+
+ORDERS_HEADER = "order_id,user_id,order_date,total_amount,status,payment_method\n"
+ITEMS_HEADER = "item_id,order_id,product_id,quantity,unit_price\n"
+
+
+class ImportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="dataweave-test-")
+        self.db = app.DatabaseManager(os.path.join(self.workdir, "ecommerce.db"))
+        self.user_id = self.db.execute_query("SELECT MIN(user_id) AS id FROM users")[0]["id"]
+        self.product_id = self.db.execute_query("SELECT MIN(product_id) AS id FROM products")[0]["id"]
+
+    def tearDown(self):
+        self.db.pool.close()
+        self.db.read_pool.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def run_import(self, table, csv, mode="append"):
+        return self.db.import_csv_stream(table, io.StringIO(csv), mode=mode)
+
+    def rollup(self):
+        return (
+            self.db.execute_query(
+                "SELECT day, status, payment_method, order_count, ROUND(sales_total, 6) AS sales "
+                "FROM daily_order_rollup ORDER BY 1, 2, 3"
+            ),
+            self.db.execute_query("SELECT * FROM daily_order_customers ORDER BY 1, 2, 3"),
+        )
+
+
+class DateValidationTest(ImportTestCase):
+    def test_non_canonical_dates_are_rejected(self):
+        values = [
+            "2025/11/03 10:00",
+            "2025-11-3 10:00:00",
+            "2025-11-03T10:00:00",
+            "2025-11-03 01:00:00+08:00",
+            "2025-02-30",
+            "2025-11-03 25:00:00",
+        ]
+        csv = ORDERS_HEADER + "".join(
+            f"{990001 + i},{self.user_id},{value},10,paid,支付宝\n" for i, value in enumerate(values)
+        )
+        result = self.run_import("orders", csv)
+        self.assertFalse(result["success"])
+        self.assertEqual(result["rejected"], len(values))
+        self.assertEqual([row["value"] for row in result["rejected_rows"]], values)
+        self.assertTrue(all(row["column"] == "order_date" for row in result["rejected_rows"]))
+
+    def test_canonical_dates_are_stored_trimmed(self):
+        csv = ORDERS_HEADER + (
+            f"990001,{self.user_id}, 2025-11-03 10:00:00 ,10,paid,支付宝\n"
+            f"990002,{self.user_id},2025-11-04,5,paid,支付宝\n"
+            f"990003,{self.user_id},,5,paid,支付宝\n"
+        )
+        result = self.run_import("orders", csv)
+        self.assertTrue(result["success"], result)
+        rows = self.db.execute_query("SELECT order_id, order_date FROM orders WHERE order_id > 990000 ORDER BY 1")
+        self.assertEqual([row["order_date"] for row in rows], ["2025-11-03 10:00:00", "2025-11-04", None])
+
+
+class ForeignKeyTest(ImportTestCase):
+    def test_dangling_and_non_integer_keys_are_rejected(self):
+        csv = ORDERS_HEADER + (
+            f"990001,{self.user_id},2025-11-03 10:00:00,10,paid,支付宝\n"
+            "990002,99999999,2025-11-03 10:00:00,10,paid,支付宝\n"
+            "990003,abc,2025-11-03 10:00:00,10,paid,支付宝\n"
+        )
+        result = self.run_import("orders", csv)
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["inserted"], 1)
+        self.assertEqual(
+            [(row["line"], row["error"]) for row in result["rejected_rows"]],
+            [(3, "在 users 中不存在"), (4, "不是整数")],
+        )
+
+    def test_missing_column_and_empty_cell_are_allowed(self):
+        result = self.run_import("orders", "order_id,order_date,total_amount\n990001,2025-11-03 10:00:00,10\n")
+        self.assertTrue(result["success"], result)
+        result = self.run_import("orders", ORDERS_HEADER + "990002,,2025-11-03 10:00:00,10,paid,支付宝\n")
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["rejected"], 0)
+
+    def test_empty_referenced_table_rejects_every_key(self):
+        with self.db.pool.connection() as conn:
+            conn.execute("DELETE FROM order_items")
+            conn.execute("DELETE FROM products")
+            conn.commit()
+        order_id = self.db.execute_query("SELECT MIN(order_id) AS id FROM orders")[0]["id"]
+        result = self.run_import("order_items", ITEMS_HEADER + f"990001,{order_id},1,1,9.9\n")
+        self.assertFalse(result["success"])
+        self.assertEqual(result["rejected_rows"][0]["error"], "在 products 中不存在")
+
+
+class KeyFormatTest(ImportTestCase):
+    def test_float_formatted_ids(self):
+        result = self.run_import("orders", ORDERS_HEADER + f"900002.0,{self.user_id},2025-11-03 10:00:00,5,paid,支付宝\n")
+        self.assertTrue(result["success"], result)
+        result = self.run_import("order_items", ITEMS_HEADER + f"990001.0,900002.0,{self.product_id},2,3.5\n")
+        self.assertTrue(result["success"], result)
+        summary = self.db.execute_query("SELECT * FROM order_item_summary WHERE order_id = 900002")
+        self.assertEqual(len(summary), 1)
+        self.assertEqual(summary[0]["item_quantity"], 2)
+
+        csv = ITEMS_HEADER + f"990001.0,900002.0,{self.product_id},3,3.5\n990002,900002,{self.product_id},1,1\n"
+        result = self.run_import("order_items", csv, mode="upsert")
+        self.assertTrue(result["success"], result)
+        self.assertEqual((result["inserted"], result["updated"]), (1, 1))
+        summary = self.db.execute_query("SELECT * FROM order_item_summary WHERE order_id = 900002")[0]
+        self.assertEqual((summary["item_count"], summary["item_quantity"]), (2, 4))
+
+
+class UpsertTest(ImportTestCase):
+    def test_counts_and_reupload(self):
+        csv = ORDERS_HEADER + (
+            f"990001,{self.user_id},2025-11-03 10:00:00,10,paid,支付宝\n"
+            f"990002,{self.user_id},2025-11-03 11:00:00,20,paid,支付宝\n"
+        )
+        self.assertEqual(self.run_import("orders", csv, mode="upsert")["inserted"], 2)
+        changed = csv.replace(",20,paid,", ",25,paid,")
+        result = self.run_import("orders", changed, mode="upsert")
+        self.assertEqual((result["inserted"], result["updated"], result["skipped"]), (0, 1, 1))
+        result = self.run_import("orders", changed, mode="skip_existing")
+        self.assertEqual((result["inserted"], result["skipped"]), (0, 2))
+
+
+class RollupTest(ImportTestCase):
+    def assert_rollup_matches_rebuild(self):
+        incremental = self.rollup()
+        self.db.rebuild_rollup()
+        self.assertEqual(incremental, self.rollup())
+
+    def test_incremental_refresh_matches_rebuild(self):
+        csv = ORDERS_HEADER + (
+            f"990001,{self.user_id},2025-11-03 00:00:00,10.5,delivered,支付宝\n"
+            f"990002,,2025-11-03 23:59:59,,,\n"
+            f"990003,{self.user_id},2025-11-04,7,cancelled,银行卡\n"
+        )
+        self.assertTrue(self.run_import("orders", csv)["success"])
+        self.assert_rollup_matches_rebuild()
+        # an upsert that moves an order to another day refreshes both days
+        moved = ORDERS_HEADER + f"990001,{self.user_id},2025-11-05 08:00:00,10.5,delivered,支付宝\n"
+        self.assertTrue(self.run_import("orders", moved, mode="upsert")["success"])
+        self.assert_rollup_matches_rebuild()
+        days = {row["day"] for row in self.rollup()[0]}
+        self.assertIn("2025-11-05", days)
+
+    def test_refresh_failure_is_reported_not_fatal(self):
+        def broken(conn, days=None):
+            raise sqlite3.IntegrityError("UNIQUE constraint failed")
+
+        self.db.refresh_rollup = broken
+        result = self.run_import("orders", ORDERS_HEADER + f"990001,{self.user_id},2025-11-03 10:00:00,1,paid,支付宝\n")
+        self.assertTrue(result["success"])
+        self.assertIn("UNIQUE constraint failed", result["refresh_error"])
+        self.assertEqual(self.db.execute_query("SELECT COUNT(*) AS n FROM orders WHERE order_id = 990001")[0]["n"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
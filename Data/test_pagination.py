@@ -0,0 +1,134 @@
+# test_pagination.py
+"""分页回归测试：服务端 SQL 游标（POST /api/query）与当日订单键集分页 / 下钻第一页。
+
+    python Data/test_pagination.py
+    python -m pytest Data/test_pagination.py
+"""
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from test_import_validation import ORDERS_HEADER, app  # noqa: E402  (loads "import mysql2.py")
+
+
+class PaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="dataweave-test-")
+        self.analyzer = app.DataAnalyzer(os.path.join(self.workdir, "ecommerce.db"), cache=app.ResultCache())
+        self.db = self.analyzer.db
+
+    def tearDown(self):
+        self.db.pool.close()
+        self.db.read_pool.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class CursorManagerTest(PaginationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cursors = app.CursorManager(self.analyzer, sweep_interval=None)
+
+    def tearDown(self):
+        self.cursors.close()
+        super().tearDown()
+
+    def test_pages_cover_every_row_once(self):
+        expected = [row["order_id"] for row in self.db.execute_query("SELECT order_id FROM orders ORDER BY order_id")]
+        page = self.cursors.open("client", "SELECT order_id FROM orders ORDER BY order_id", page_size=7)
+        seen = [row[0] for row in page["data"]]
+        while page["has_more"]:
+            self.assertEqual(page["offset"] + page["rows"], len(seen))
+            page = self.cursors.fetch("client", page["cursor_id"], page_size=7)
+            seen += [row[0] for row in page["data"]]
+        self.assertEqual(seen, expected)
+        self.assertIsNone(page["cursor_id"])
+        self.assertEqual(self.cursors.stats()["open"], 0)
+
+    def test_cursor_belongs_to_its_client(self):
+        page = self.cursors.open("a", "SELECT order_id FROM orders", page_size=1)
+        self.assertIsNone(self.cursors.fetch("b", page["cursor_id"]))
+        self.assertFalse(self.cursors.discard("b", page["cursor_id"]))
+        self.assertTrue(self.cursors.discard("a", page["cursor_id"]))
+        self.assertIsNone(self.cursors.fetch("a", page["cursor_id"]))
+
+    def test_fetch_error_closes_cursor(self):
+        with self.db.pool.connection() as conn:
+            conn.execute("CREATE TABLE badtext (t TEXT)")
+            conn.executemany("INSERT INTO badtext VALUES (CAST(? AS TEXT))", [(b"ok",)] * 3 + [(b"\xff\xfe",)])
+            conn.commit()
+        page = self.cursors.open("client", "SELECT t FROM badtext", page_size=2)
+        self.assertTrue(page["has_more"])
+        self.assertIn("error", self.cursors.fetch("client", page["cursor_id"], page_size=2))
+        self.assertEqual(self.cursors.stats()["open"], 0)
+
+    def test_single_page_results_are_replayed_from_cache(self):
+        sql = "SELECT status, COUNT(*) AS n FROM orders GROUP BY status"
+        first = self.cursors.open("client", sql)
+        second = self.cursors.open("client", sql)
+        self.assertEqual(first["data"], second["data"])
+        self.assertEqual(self.analyzer.query_cache.stats()["result_hits"], 1)
+
+    def test_rejects_writes(self):
+        self.assertIn("error", self.cursors.open("client", "DELETE FROM orders"))
+
+
+class DayOrdersPageTest(PaginationTestCase):
+    DAY = "2030-01-15"  # no seed orders on this day
+    ORDERS = 60
+
+    def setUp(self):
+        super().setUp()
+        user_id = self.db.execute_query("SELECT MIN(user_id) AS id FROM users")[0]["id"]
+        # several orders share a timestamp: the keyset must break ties on order_id
+        csv = ORDERS_HEADER + "".join(
+            f"{990001 + i},{user_id},{self.DAY} {i // 4:02d}:00:00,{i + 1},paid,支付宝\n" for i in range(self.ORDERS)
+        )
+        self.assertTrue(self.db.import_csv_stream("orders", io.StringIO(csv))["success"])
+
+    def read_all(self, **kwargs):
+        ids, cursor = [], None
+        while True:
+            page = self.analyzer.get_day_orders_page(self.DAY, 5, cursor, **kwargs)
+            self.assertLessEqual(len(page["orders"]), 5)
+            ids += [row["order_id"] for row in page["orders"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_keyset_pages_cover_the_day(self):
+        self.assertEqual(self.read_all(), list(range(990001, 990001 + self.ORDERS)))
+        self.assertEqual(self.read_all(descending=True), list(range(990000 + self.ORDERS, 990000, -1)))
+
+    def test_invalid_cursors(self):
+        for token in ("not-base64!", app.encode_cursor({"a": 1}, 2), app.encode_cursor("x", True), app.encode_cursor(1)):
+            self.assertEqual(self.analyzer.get_day_orders_page(self.DAY, 5, token), {"error": "cursor 无效"})
+
+    def test_drilldown_returns_first_page_and_whole_day_charts(self):
+        data = self.analyzer.get_day_drilldown(self.DAY)
+        self.assertEqual(len(data["orders"]), app.DataAnalyzer.DAY_PAGE_SIZE)
+        rest = self.analyzer.get_day_orders_page(self.DAY, self.ORDERS, data["next_cursor"])
+        self.assertEqual(len(data["orders"]) + len(rest["orders"]), self.ORDERS)
+        self.assertIsNone(rest["next_cursor"])
+        self.assertEqual(sum(group["orders"] for group in data["hour"]), self.ORDERS)
+        self.assertEqual(sum(group["orders"] for group in data["payment"]), self.ORDERS)
+
+    def test_drilldown_error_is_not_cached(self):
+        original = self.db.execute_query
+
+        def busy(*args, **kwargs):
+            raise sqlite3.OperationalError("database is locked")
+
+        self.db.execute_query = busy
+        self.assertIn("error", self.analyzer.get_day_drilldown(self.DAY))
+        self.db.execute_query = original
+        self.assertNotIn("error", self.analyzer.get_day_drilldown(self.DAY))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Helpers shared by the benchmark scripts (load the server module, scratch databases)."""
+
+import importlib.util
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_PATH = ROOT / "import mysql2.py"
+
+
+def load_app():
+    """Import ``import mysql2.py`` (the file name is not a valid module name)."""
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))  # for its sibling modules (schema_catalog)
+    spec = importlib.util.spec_from_file_location("dashboard_app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def scratch_copy(db_name: str = "ecommerce.db") -> str:
+    """Copy the demo database into a temp dir and chdir there; returns the db path."""
+    workdir = tempfile.mkdtemp(prefix="dataweave-bench-")
+    src = ROOT / db_name
+    dst = os.path.join(workdir, db_name)
+    if src.exists():
+        shutil.copy(src, dst)
+    os.chdir(workdir)
+    return dst
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p99/max in milliseconds."""
+    if not samples:
+        return {"p50": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    p99_index = min(len(ordered) - 1, int(round(0.99 * (len(ordered) - 1))))
+    return {
+        "p50": statistics.median(ordered) * 1000,
+        "p99": ordered[p99_index] * 1000,
+        "max": ordered[-1] * 1000,
+    }
+
+
+def build_synthetic_db(path: str, orders: int = 1_000_000, days: int = 365, seed: int = 7) -> str:
+    """Create a bare-schema database (no secondary indexes) with ``orders`` spread over ``days``."""
+    import random
+    import sqlite3
+    from datetime import datetime, timedelta
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=OFF;
+        CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, email TEXT,
+            registration_date DATETIME, last_login DATETIME, status TEXT);
+        CREATE TABLE products (product_id INTEGER PRIMARY KEY, product_name TEXT, category TEXT,
+            price REAL, cost REAL, stock_quantity INTEGER, status TEXT, created_at DATETIME);
+        CREATE TABLE orders (order_id INTEGER PRIMARY KEY, user_id INTEGER, order_date DATETIME,
+            total_amount REAL, status TEXT, payment_method TEXT);
+        CREATE TABLE order_items (item_id INTEGER PRIMARY KEY, order_id INTEGER, product_id INTEGER,
+            quantity INTEGER, unit_price REAL);
+        """
+    )
+    conn.executemany(
+        "INSERT INTO users VALUES (?,?,?,?,?,?)",
+        ((i, f"user{i}", f"user{i}@example.com", "2024-01-01 00:00:00", "2024-06-01 00:00:00", "active")
+         for i in range(1, 20_001)),
+    )
+    categories = ["电子产品", "服装", "家居", "美妆", "食品"]
+    prices = {pid: round(rng.uniform(20, 3000), 2) for pid in range(1, 201)}
+    conn.executemany(
+        "INSERT INTO products VALUES (?,?,?,?,?,?,?,?)",
+        ((pid, f"商品{pid}", categories[pid % 5], price, round(price * 0.6, 2), 100, "active",
+          "2024-01-01 00:00:00") for pid, price in prices.items()),
+    )
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    span = days * 86400
+    statuses = ("delivered", "shipped", "pending", "cancelled")
+    methods = ("支付宝", "微信支付", "银行卡")
+    items = []
+
+    def order_rows():
+        item_id = 1
+        for order_id in range(1, orders + 1):
+            ts = start + timedelta(seconds=rng.randrange(span))
+            total = 0.0
+            for _ in range(rng.randint(1, 3)):
+                pid = rng.randint(1, 200)
+                qty = rng.randint(1, 2)
+                total += prices[pid] * qty
+                items.append((item_id, order_id, pid, qty, prices[pid]))
+                item_id += 1
+            yield (order_id, rng.randint(1, 20_000), ts.strftime("%Y-%m-%d %H:%M:%S"), round(total, 2),
+                   rng.choice(statuses), rng.choice(methods))
+            if len(items) >= 50_000:
+                conn.executemany("INSERT INTO order_items VALUES (?,?,?,?,?)", items)
+                items.clear()
+
+    conn.executemany("INSERT INTO orders VALUES (?,?,?,?,?,?)", order_rows())
+    conn.executemany("INSERT INTO order_items VALUES (?,?,?,?,?)", items)
+    conn.commit()
+    conn.close()
+    return path
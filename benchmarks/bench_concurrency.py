@@ -0,0 +1,91 @@
+"""Load benchmark: 50 concurrent clients against the dashboard endpoints.
+
+Compares the original single-threaded TCPServer with the bounded thread pool:
+
+    python benchmarks/bench_concurrency.py --clients 50 --requests 20
+"""
+
+import argparse
+import http.client
+import threading
+import time
+
+from _app import load_app, percentiles, scratch_copy
+
+ENDPOINTS = ("/api/dashboard/overview", "/api/sales/trend")
+
+
+def run_clients(port: int, clients: int, requests_per_client: int):
+    latencies = {path: [] for path in ENDPOINTS}
+    errors = []
+    lock = threading.Lock()
+    start_gate = threading.Event()
+
+    def client(idx: int) -> None:
+        start_gate.wait()
+        for n in range(requests_per_client):
+            path = ENDPOINTS[(idx + n) % len(ENDPOINTS)]
+            started = time.perf_counter()
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                conn.request("GET", path)
+                resp = conn.getresponse()
+                resp.read()
+                conn.close()
+                status = resp.status
+            except OSError as exc:
+                status = repr(exc)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status == 200:
+                    latencies[path].append(elapsed)
+                else:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    wall = time.perf_counter()
+    start_gate.set()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - wall
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=64)
+    args = parser.parse_args()
+
+    scratch_copy()
+    app = load_app()
+
+    class QuietHandler(app.EcommerceHandler):
+        def log_message(self, format, *args):  # noqa: A002 - stdlib signature
+            pass
+
+    for mode in ("single", "threaded"):
+        # one loopback client IP makes every request; keep the limiter out of the measurement
+        limiter = app.TokenBucketLimiter(max_requests=10**9, sweep_interval=None)
+        server = app.build_server(
+            0, mode, args.workers, args.max_queue, handler_class=QuietHandler, rate_limiter=limiter
+        )
+        port = server.server_address[1]
+        serve = threading.Thread(target=server.serve_forever, daemon=True)
+        serve.start()
+        latencies, errors, wall = run_clients(port, args.clients, args.requests)
+        server.shutdown()
+        server.server_close()
+
+        total = sum(len(v) for v in latencies.values())
+        print(f"[{mode}] {total} ok / {len(errors)} failed in {wall:.2f}s ({total / wall:.0f} req/s)")
+        for path, samples in latencies.items():
+            p = percentiles(samples)
+            print(f"  {path:<28} p50={p['p50']:.1f}ms p99={p['p99']:.1f}ms max={p['max']:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
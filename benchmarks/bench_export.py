@@ -0,0 +1,72 @@
+"""Bulk export throughput: /api/export/{table} as Arrow IPC and Parquet (needs pyarrow).
+
+    python benchmarks/bench_export.py --orders 1000000
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from _app import build_synthetic_db, load_app
+
+
+def fetch(port: int, path: str):
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+    conn.request("GET", path)
+    resp = conn.getresponse()
+    size = 0
+    while True:
+        chunk = resp.read(1 << 20)
+        if not chunk:
+            break
+        size += len(chunk)
+    conn.close()
+    return resp.status, size, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    app = load_app()
+    if app.pa is None:
+        raise SystemExit("pyarrow is not installed")
+    workdir = tempfile.mkdtemp(prefix="dataweave-bench-")
+    db_path = os.path.join(workdir, "ecommerce.db")
+    build_synthetic_db(db_path, orders=args.orders)
+    analyzer = app.DataAnalyzer(db_path)
+    row_counts = {t: analyzer.db.get_table_row_count(t) for t in ("orders", "order_items")}
+
+    class QuietHandler(app.EcommerceHandler):
+        def log_message(self, format, *args):  # noqa: A002 - stdlib signature
+            pass
+
+    limiter = app.TokenBucketLimiter(max_requests=10**9, sweep_interval=None)
+    server = app.build_server(0, "threaded", handler_class=QuietHandler, analyzer=analyzer, rate_limiter=limiter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    week_from = (date.today() - timedelta(days=7)).isoformat()
+    for table in ("orders", "order_items"):
+        for fmt in ("arrow", "parquet"):
+            status, size, elapsed = fetch(port, f"/api/export/{table}?format={fmt}")
+            rows = row_counts[table]
+            print(f"{table:<12} {fmt:<8} {rows:>9,} rows  {size / 1e6:7.1f} MB  {elapsed:6.2f}s  "
+                  f"{rows / elapsed:>12,.0f} rows/s  (HTTP {status})")
+        status, size, elapsed = fetch(port, f"/api/export/{table}?format=arrow&from={week_from}")
+        print(f"{table:<12} arrow, from={week_from}: {size / 1e6:.1f} MB in {elapsed:.3f}s")
+
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
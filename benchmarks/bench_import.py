@@ -0,0 +1,98 @@
+"""Streaming CSV import: POST generated orders, then order_items (with ~1% dangling
+foreign keys for the validation stage to reject), as text/csv; report rows/s and peak RSS.
+
+    python benchmarks/bench_import.py --rows 1000000
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import resource
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+from _app import load_app, scratch_copy
+
+
+def write_orders_csv(path: str, rows: int, first_id: int, user_ids, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=365)
+    statuses = ("pending", "paid", "shipped", "delivered", "cancelled")
+    payments = ("支付宝", "微信支付", "银行卡", "信用卡")
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        fh.write("order_id,user_id,order_date,total_amount,status,payment_method\n")
+        for i in range(rows):
+            ts = start + timedelta(seconds=rng.randrange(365 * 86400))
+            fh.write(f"{first_id + i},{rng.choice(user_ids)},{ts:%Y-%m-%d %H:%M:%S},"
+                     f"{rng.uniform(10, 5000):.2f},{rng.choice(statuses)},{rng.choice(payments)}\n")
+
+
+def write_order_items_csv(path: str, rows: int, first_order: int, orders: int, product_ids, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        fh.write("item_id,order_id,product_id,quantity,unit_price\n")
+        for i in range(rows):
+            # ~1% of rows point at an order that does not exist
+            order_id = first_order + (rng.randrange(orders) if rng.random() > 0.01 else orders + i)
+            fh.write(f"{first_order + i},{order_id},{rng.choice(product_ids)},{rng.randint(1, 5)},{rng.uniform(5, 2000):.2f}\n")
+
+
+def upload(port: int, path: str, table: str):
+    size = os.path.getsize(path)
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=3600)
+    with open(path, "rb") as fh:
+        conn.request("POST", f"/api/data/import?table={table}", body=fh,
+                     headers={"Content-Type": "text/csv", "Content-Length": str(size)})
+        resp = conn.getresponse()
+        body = json.loads(resp.read())
+    conn.close()
+    return body, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    app = load_app()
+    db_path = scratch_copy()
+    workdir = os.path.dirname(db_path)
+    csv_path = os.path.join(workdir, "orders.csv")
+    items_path = os.path.join(workdir, "order_items.csv")
+    analyzer = app.DataAnalyzer(db_path)
+    user_ids = [row["user_id"] for row in analyzer.db.execute_query("SELECT user_id FROM users")]
+    product_ids = [row["product_id"] for row in analyzer.db.execute_query("SELECT product_id FROM products")]
+    write_orders_csv(csv_path, args.rows, 10_000_000, user_ids)
+    write_order_items_csv(items_path, args.rows, 10_000_000, args.rows, product_ids)
+    print(f"CSV: {args.rows:,} rows, {os.path.getsize(csv_path) / 1e6:.1f} MB")
+
+    class QuietHandler(app.EcommerceHandler):
+        def log_message(self, format, *args):  # noqa: A002 - stdlib signature
+            pass
+
+    limiter = app.TokenBucketLimiter(max_requests=10**9, sweep_interval=None)
+    server = app.build_server(0, "threaded", handler_class=QuietHandler, analyzer=analyzer, rate_limiter=limiter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    for table, path in (("orders", csv_path), ("order_items", items_path)):
+        body, elapsed = upload(server.server_address[1], path, table)
+        if not body.get("success"):
+            raise SystemExit(f"{table} import failed: {body.get('error')}")
+        print(f"{table:<12} imported {body['rows']:,} rows in {len(body['chunks'])} chunks, "
+              f"rejected {body['rejected']:,}, {elapsed:.2f}s ({body['rows_parsed'] / elapsed:,.0f} rows/s end to end)")
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS {rss_before:.0f} MB -> {rss_after:.0f} MB")
+
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
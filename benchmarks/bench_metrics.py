@@ -0,0 +1,71 @@
+"""Overhead of the /api/_metrics instrumentation: the same requests against a server
+without metrics and one with them, interleaved so both see the same machine noise
+(median latency per request).
+
+    python benchmarks/bench_metrics.py --requests 2000
+"""
+
+import argparse
+import http.client
+import statistics
+import threading
+import time
+import urllib.parse
+
+from _app import load_app, scratch_copy
+
+
+def one_request(port: int, path: str) -> float:
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request("GET", path)
+    conn.getresponse().read()
+    conn.close()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    db_path = scratch_copy()
+    app = load_app()
+
+    class QuietHandler(app.EcommerceHandler):
+        def log_message(self, format, *args):  # noqa: A002 - stdlib signature
+            pass
+
+    ports = {}
+    for label, metrics in (("off", None), ("on", app.Metrics())):
+        analyzer = app.DataAnalyzer(db_path, cache=app.ResultCache(), metrics=metrics)
+        limiter = app.TokenBucketLimiter(max_requests=10**9, sweep_interval=None)
+        server = app.build_server(0, "single", handler_class=QuietHandler, analyzer=analyzer, rate_limiter=limiter)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ports[label] = server.server_address[1]
+
+    day = analyzer.db.execute_query("SELECT date(MAX(order_date)) AS day FROM orders")[0]["day"]
+    paths = (
+        "/api/dashboard/overview",  # result cache hit: request overhead only
+        f"/api/orders/day/{day}",  # keyset page (first 50 orders) on every request
+        "/api/query/" + urllib.parse.quote("SELECT status, COUNT(*) AS n FROM orders GROUP BY status"),
+    )
+    for path in paths:
+        samples = {"off": [], "on": []}
+        for label, port in ports.items():
+            for _ in range(20):  # warm up
+                one_request(port, path)
+        order = list(ports.items())
+        for _ in range(args.requests):
+            order.reverse()  # alternate which server goes first
+            for label, port in order:
+                samples[label].append(one_request(port, path))
+        off, on = statistics.median(samples["off"]), statistics.median(samples["on"])
+        print(
+            f"{path[:40]:<40} off={off * 1000:.3f}ms on={on * 1000:.3f}ms "
+            f"overhead={(on - off) / off * 100:+.2f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Rate limiter microbenchmark at 10k distinct client IPs.
+
+Compares the old list-of-timestamps check (made server-wide so it actually limits)
+with TokenBucketLimiter:
+
+    python benchmarks/bench_rate_limiter.py --clients 10000 --checks 500000
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from _app import load_app
+
+
+class TimestampListLimiter:
+    """The previous algorithm: keep every timestamp in the window, rebuild the list per check."""
+
+    def __init__(self, max_requests: int = 120, window: float = 60.0) -> None:
+        self.store = {}
+        self.max_requests = max_requests
+        self.window = window
+
+    def check(self, key: str):
+        now = time.time()
+        bucket = self.store.setdefault(key, [])
+        bucket[:] = [t for t in bucket if now - t <= self.window]
+        if len(bucket) >= self.max_requests:
+            return False, 0.0
+        bucket.append(now)
+        return True, 0.0
+
+
+def run(limiter, keys, checks: int):
+    started = time.perf_counter()
+    limited = 0
+    for i in range(checks):
+        allowed, _ = limiter.check(keys[i % len(keys)])
+        limited += not allowed
+    return time.perf_counter() - started, limited
+
+
+def retained_memory(factory, keys, checks: int) -> int:
+    tracemalloc.start()
+    limiter = factory()
+    run(limiter, keys, checks)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--checks", type=int, default=500_000)
+    args = parser.parse_args()
+
+    app = load_app()
+    rng = random.Random(1)
+    keys = [f"10.{rng.randrange(256)}.{i // 256 % 256}.{i % 256}" for i in range(args.clients)]
+    for label, factory in (
+        ("timestamp list (old)", TimestampListLimiter),
+        ("token bucket", lambda: app.TokenBucketLimiter(sweep_interval=None)),
+    ):
+        elapsed, limited = run(factory(), keys, args.checks)
+        memory = retained_memory(factory, keys, args.checks)
+        print(
+            f"{label:<22} {args.checks / elapsed:>11,.0f} checks/s  "
+            f"{elapsed / args.checks * 1e9:6.0f} ns/check  limited={limited:<7} retained={memory / 1e6:.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Startup vs per-request overhead: schema bootstrap per request (old) vs once per server.
+
+    python benchmarks/bench_request_overhead.py --requests 500
+"""
+
+import argparse
+import http.client
+import threading
+import time
+
+from _app import load_app, percentiles, scratch_copy
+
+PATH = "/api/dashboard/overview"
+
+
+def timed_requests(port: int, count: int):
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request("GET", PATH)
+        conn.getresponse().read()
+        conn.close()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    db_path = scratch_copy()
+    app = load_app()
+
+    started = time.perf_counter()
+    analyzer = app.DataAnalyzer(db_path, cache=app.ResultCache())
+    print(f"startup (pools + schema bootstrap + index/rollup check): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    for _ in range(50):
+        app.DataAnalyzer(db_path)
+    bootstrap = (time.perf_counter() - started) / 50
+    print(f"DataAnalyzer() on a warm database:                         {bootstrap * 1000:.2f} ms")
+
+    class QuietHandler(app.EcommerceHandler):
+        def log_message(self, format, *args):  # noqa: A002 - stdlib signature
+            pass
+
+    class PerRequestHandler(QuietHandler):
+        """The old behaviour: a fresh DataAnalyzer (and ensure_database) per request."""
+
+        @property
+        def analyzer(self):
+            return app.DataAnalyzer(db_path, cache=self.server.analyzer.cache)
+
+    for label, handler in (("per-request analyzer", PerRequestHandler), ("shared analyzer", QuietHandler)):
+        limiter = app.TokenBucketLimiter(max_requests=10**9, sweep_interval=None)
+        server = app.build_server(0, "single", handler_class=handler, analyzer=analyzer, rate_limiter=limiter)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        timed_requests(server.server_address[1], 20)  # warm up
+        p = percentiles(timed_requests(server.server_address[1], args.requests))
+        server.shutdown()
+        server.server_close()
+        print(f"{label:<22} {PATH}: p50={p['p50']:.2f}ms p99={p['p99']:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,36 +5,1785 @@
 - 提供仪表盘、SQL 查询、数据导入等 API
 """
 
+import argparse
+import base64
+import cProfile
+import glob
+import hashlib
 import http.server
+import ipaddress
+import pstats
 import socketserver
 import json
+import math
+import queue
 import sqlite3
+import threading
 from datetime import datetime, timedelta
 import random
 import os
 import urllib.parse
+import numpy as np
 import pandas as pd
 import io
 import re
+import shutil
+import sys
+import tempfile
 import time
-from typing import List, Dict, Any
+import uuid
+import zlib
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import List, Dict, Any, Callable, Iterator
 
+from schema_catalog import get_schema_catalog
 
-class DatabaseManager:
-    def __init__(self, db_path: str = "ecommerce.db") -> None:
+try:
+    import brotli  # optional: enables Content-Encoding: br
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import pyarrow as pa  # optional: enables /api/export/ and faster CSV validation
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pc = pq = None
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """No pooled connection became free within the wait timeout."""
+
+
+class CursorLimitError(RuntimeError):
+    """A client (or the server) already holds the maximum number of open SQL cursors."""
+
+
+class QueryCancelledError(sqlite3.OperationalError):
+    """An ad-hoc query stopped by its QueryGuard budget (wall clock or VM steps)."""
+
+
+class QueryRejectedError(sqlite3.OperationalError):
+    """An ad-hoc query refused by the QueryGuard plan check before it ran."""
+
+
+class ConnectionPool:
+    """Checkout/return pool of tuned sqlite3 connections for one database file.
+
+    Connections are opened lazily up to ``size``; PRAGMAs are applied once when a
+    connection is created, not on every checkout. A ``read_only`` pool opens the
+    file with a ``mode=ro`` URI so readers can never take the write lock.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA temp_store=MEMORY",
+    )
+    # journal_mode/synchronous are the writer's business; readers just follow the WAL.
+    READ_ONLY_PRAGMAS = (
+        "PRAGMA query_only=1",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    # compiled statements kept per connection (sqlite3 default 128); repeated SQL skips the prepare
+    CACHED_STATEMENTS = 256
+
+    def __init__(self, db_path: str, size: int = 8, wait_timeout: float = 5.0, read_only: bool = False) -> None:
         self.db_path = db_path
-        self.allowed_tables = ("users", "products", "orders", "order_items")
-        self.ensure_database()
+        self.size = max(1, size)
+        self.wait_timeout = wait_timeout
+        self.read_only = read_only
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self.peak_in_use = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
 
-    def get_connection(self) -> sqlite3.Connection:
-        """Return a sqlite3 connection; caller must close it."""
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            uri = "file:" + urllib.parse.quote(os.path.abspath(self.db_path)) + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=self.CACHED_STATEMENTS)
+            pragmas = self.READ_ONLY_PRAGMAS
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=self.CACHED_STATEMENTS)
+            pragmas = self.PRAGMAS
         conn.row_factory = sqlite3.Row
+        for pragma in pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def _checked_out(self) -> None:
+        with self._lock:
+            self._in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self._in_use)
+
+    def acquire(self) -> sqlite3.Connection:
+        conn = self._acquire()
+        self._checked_out()
         return conn
 
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+                self.misses += 1
+            else:
+                self.waits += 1
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        started = time.perf_counter()
+        try:
+            return self._idle.get(timeout=self.wait_timeout)
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeoutError(f"数据库连接池已满（{self.size}），等待 {self.wait_timeout}s 超时")
+        finally:
+            with self._lock:
+                self.wait_seconds += time.perf_counter() - started
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection: drop it so the slot can be reopened.
+            with self._lock:
+                self._opened -= 1
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": "read_only" if self.read_only else "read_write",
+                "size": self.size,
+                "open": self._opened,
+                "idle": self._idle.qsize(),
+                "in_use": self._in_use,
+                "peak_in_use": self.peak_in_use,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 4),
+                "timeouts": self.timeouts,
+            }
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+_POOLS: Dict[tuple, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_connection_pool(
+    db_path: str, size: int = 8, wait_timeout: float = 5.0, read_only: bool = False
+) -> ConnectionPool:
+    """Return the process-wide pool for ``db_path``; size/timeout only apply on first use."""
+    key = (os.path.abspath(db_path), read_only)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = ConnectionPool(db_path, size=size, wait_timeout=wait_timeout, read_only=read_only)
+        return pool
+
+
+class QueryBudget:
+    """Progress-handler callback enforcing one statement's wall-clock and VM-step limits."""
+
+    def __init__(self, guard: "QueryGuard") -> None:
+        self.guard = guard
+        self.deadline = time.monotonic() + guard.timeout if guard.timeout > 0 else None
+        self.steps = 0
+        self.reason: str | None = None
+
+    def __call__(self) -> int:
+        self.steps += self.guard.CHECK_EVERY
+        if self.reason is None:
+            if self.guard.max_steps > 0 and self.steps > self.guard.max_steps:
+                self.reason = "steps"
+            elif self.deadline is not None and time.monotonic() > self.deadline:
+                self.reason = "timeout"
+            else:
+                return 0
+            self.guard.record_cancel(self.reason)
+        return 1  # non-zero makes SQLite abort the statement with "interrupted"
+
+    def resume(self, spent: float) -> None:
+        """Restart the clock before the next SQLite call, ``spent`` seconds already used up.
+
+        Time between calls (e.g. a stream blocked on a slow client) is not charged.
+        """
+        if self.deadline is not None:
+            self.deadline = time.monotonic() + self.guard.timeout - spent
+
+    def error(self) -> QueryCancelledError:
+        if self.reason == "timeout":
+            return QueryCancelledError(f"查询已取消：执行超过 {self.guard.timeout:g} 秒")
+        return QueryCancelledError(f"查询已取消：超过 {self.guard.max_steps} 步执行上限")
+
+
+class QueryGuard:
+    """Execution limits for ad-hoc SQL (/api/query/).
+
+    Before a query runs, its ``EXPLAIN QUERY PLAN`` is checked: a select block that
+    full-scans several tables whose estimated row product exceeds ``max_scan_rows`` is
+    rejected. While it runs, sqlite3's progress handler cancels it once it exceeds
+    ``timeout`` seconds or ``max_steps`` VM instructions. A limit of 0 disables it.
+    Streamed queries are charged only for time spent inside SQLite (QueryBudget.resume).
+    """
+
+    CHECK_EVERY = 1000  # VM instructions between progress-handler calls
+    ESTIMATE_TTL = 60.0  # seconds a table's COUNT(*) is reused as its row estimate
+    SCAN_RE = re.compile(r"^SCAN (\S+)")
+    DERIVED_RE = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\S+)")
+
+    def __init__(self, timeout: float = 5.0, max_steps: int = 200_000_000, max_scan_rows: int = 10_000_000) -> None:
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.max_scan_rows = max_scan_rows
+        self._estimates: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.cancelled_timeout = 0
+        self.cancelled_steps = 0
+        self.rejected = 0
+
+    def begin(self, conn: sqlite3.Connection) -> QueryBudget:
+        """Install a fresh budget on ``conn``; ``end`` must remove it before the connection is reused."""
+        budget = QueryBudget(self)
+        if self.timeout > 0 or self.max_steps > 0:
+            conn.set_progress_handler(budget, self.CHECK_EVERY)
+        with self._lock:
+            self.started += 1
+        return budget
+
+    @staticmethod
+    def end(conn: sqlite3.Connection) -> None:
+        conn.set_progress_handler(None, 0)
+
+    def record_cancel(self, reason: str) -> None:
+        with self._lock:
+            if reason == "timeout":
+                self.cancelled_timeout += 1
+            else:
+                self.cancelled_steps += 1
+
+    def estimate_rows(self, conn: sqlite3.Connection, table: str) -> int | None:
+        """Row count of ``table`` (cached for ESTIMATE_TTL); None when it is not a table."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._estimates.get(table)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        quoted = table.replace('"', '""')
+        try:
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{quoted}"').fetchone()[0]
+        except sqlite3.Error:
+            rows = None
+        with self._lock:
+            self._estimates[table] = (now + self.ESTIMATE_TTL, rows)
+        return rows
+
+    def check_plan(self, conn: sqlite3.Connection, query: str, params: tuple | None = None) -> None:
+        """Raise QueryRejectedError when one select block full-scans tables worth more than ``max_scan_rows``."""
+        if self.max_scan_rows <= 0:
+            return
+        plan = conn.execute("EXPLAIN QUERY PLAN " + query, params or ()).fetchall()
+        nodes = {row[0]: (row[1], row[3]) for row in plan}
+        derived: Dict[str, int] = {}  # MATERIALIZE/CO-ROUTINE name -> plan node id
+        scans: Dict[int, List[tuple]] = {}  # select block -> [(name, estimated rows)]
+
+        def block_of(node_id: int) -> int:
+            # a correlated subquery re-runs for every outer row, so its scans multiply the outer block's
+            parent = nodes[node_id][0]
+            while parent in nodes and nodes[parent][1].startswith("CORRELATED "):
+                parent = nodes[parent][0]
+            return parent
+
+        def rows_of(name: str) -> int | None:
+            if name in derived:
+                estimate = 1
+                for _, rows in scans.get(derived[name], []):
+                    estimate *= rows
+                return estimate
+            return self.estimate_rows(conn, name)
+
+        for node_id, (_, detail) in nodes.items():
+            match = self.DERIVED_RE.match(detail)
+            if match:
+                derived[match.group(1)] = node_id
+                continue
+            match = self.SCAN_RE.match(detail)
+            if match is None or detail.startswith("SCAN CONSTANT ROW"):
+                continue
+            name = match.group(1)
+            rows = rows_of(name)
+            if rows is None:
+                # the plan shows aliases: "FROM order_items i" scans "i"
+                alias = re.search(
+                    rf'(?:\bfrom|\bjoin|,)\s*"?(\w+)"?\s+(?:as\s+)?"?{re.escape(name)}"?(?!\w)', query, re.I
+                )
+                rows = rows_of(alias.group(1)) if alias else None
+            if rows:
+                scans.setdefault(block_of(node_id), []).append((name, rows))
+
+        for block in scans.values():
+            if len(block) < 2:
+                continue
+            product = 1
+            for _, rows in block:
+                product *= rows
+            if product > self.max_scan_rows:
+                with self._lock:
+                    self.rejected += 1
+                tables = " × ".join(f"{name}≈{rows}" for name, rows in block)
+                raise QueryRejectedError(
+                    f"查询被拒绝：{tables} 全表扫描组合约 {product} 行，超过上限 {self.max_scan_rows}；请添加关联条件或过滤"
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "timeout": self.timeout,
+                "max_steps": self.max_steps,
+                "max_scan_rows": self.max_scan_rows,
+                "started": self.started,
+                "cancelled": self.cancelled_timeout + self.cancelled_steps,
+                "cancelled_timeout": self.cancelled_timeout,
+                "cancelled_steps": self.cancelled_steps,
+                "rejected": self.rejected,
+            }
+
+
+class QueryStream:
+    """A running read query whose rows are fetched in ``fetchmany`` batches.
+
+    Holds a pooled connection until the rows are exhausted or ``close`` is called, so
+    large results can be written to the socket without building a list of dicts.
+    With a ``guard`` the plan is checked first, the query runs under a QueryBudget and
+    the first batch is fetched up front, so a cancelled query fails before any
+    response is written; later batches stay under the same budget, whose timeout counts
+    only the time spent in SQLite. ``keep_rows`` keeps up to that many rows in ``kept`` (None
+    once exceeded) and ``on_complete(stream)`` runs after the last row was read.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        query: str,
+        params: tuple | None = None,
+        batch_size: int = 500,
+        guard: QueryGuard | None = None,
+        keep_rows: int = 0,
+        on_complete: Callable[["QueryStream"], None] | None = None,
+        metrics: "Metrics | None" = None,
+    ) -> None:
+        self._pool = pool
+        self._conn = pool.acquire()
+        self._query = query
+        self._params = params
+        self._metrics = metrics
+        self.sql_seconds = 0.0
+        self._cursor = None
+        self._budget: QueryBudget | None = None
+        self._first: list | None = None
+        self.batch_size = batch_size
+        self.row_count = 0
+        self.keep_rows = keep_rows
+        self.kept: list | None = [] if keep_rows > 0 else None
+        self.on_complete = on_complete
+        try:
+            if guard is not None:
+                guard.check_plan(self._conn, query, params)
+                self._budget = guard.begin(self._conn)
+            self._cursor = self._conn.cursor()
+            self._cursor.row_factory = None  # plain tuples: no per-row Row/dict objects
+            self._run(self._cursor.execute, query, params or ())
+            if guard is not None:
+                self._first = self._run(self._cursor.fetchmany, batch_size)
+        except Exception:
+            self.close()
+            raise
+        description = self._cursor.description or ()
+        self.columns = [d[0] for d in description]
+
+    def _run(self, step: Callable, *args: Any) -> Any:
+        if self._budget is not None:
+            self._budget.resume(self.sql_seconds)  # the timeout covers SQLite time, not socket writes
+        started = time.perf_counter()
+        try:
+            return step(*args)
+        except sqlite3.OperationalError as exc:
+            if self._budget is not None and self._budget.reason:
+                raise self._budget.error() from exc
+            raise
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+
+    def batches(self) -> Iterator[list]:
+        completed = False
+        try:
+            while self._conn is not None:
+                if self._first is not None:
+                    rows, self._first = self._first, None
+                else:
+                    rows = self._run(self._cursor.fetchmany, self.batch_size)
+                if not rows:
+                    completed = True
+                    break
+                self.row_count += len(rows)
+                if self.kept is not None:
+                    if len(self.kept) + len(rows) <= self.keep_rows:
+                        self.kept.extend(rows)
+                    else:
+                        self.kept = None
+                yield rows
+        finally:
+            self.close()
+        if completed and self.on_complete is not None:
+            self.on_complete(self)
+
+    def __iter__(self) -> Iterator[tuple]:
+        for rows in self.batches():
+            yield from rows
+
+    def close(self) -> None:
+        if self._conn is not None:
+            if self._cursor is not None:
+                self._cursor.close()
+            if self._budget is not None:
+                QueryGuard.end(self._conn)
+            if self._metrics is not None:
+                self._metrics.observe_sql(self._query, self.sql_seconds, self.row_count, self._conn, self._params)
+            self._pool.release(self._conn)
+            self._conn = None
+
+
+class CachedQueryStream(QueryStream):
+    """Replays rows kept by the QueryCache through the QueryStream interface (no connection)."""
+
+    def __init__(self, columns: List[str], rows: List[tuple], batch_size: int = 500) -> None:
+        self._conn = None
+        self._rows = rows
+        self.columns = columns
+        self.batch_size = batch_size
+        self.row_count = 0
+
+    def batches(self) -> Iterator[list]:
+        for start in range(0, len(self._rows), self.batch_size):
+            rows = self._rows[start:start + self.batch_size]
+            self.row_count += len(rows)
+            yield rows
+
+
+def arrow_column(values: tuple, arrow_type: Any) -> Any:
+    """Build an Arrow array, coercing stray values that SQLite's loose typing let through."""
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        if pa.types.is_integer(arrow_type):
+            convert = int
+        elif pa.types.is_floating(arrow_type):
+            convert = float
+        else:
+            convert = str
+        coerced = []
+        for value in values:
+            try:
+                coerced.append(None if value is None else convert(value))
+            except (TypeError, ValueError, OverflowError):
+                coerced.append(None)
+        return pa.array(coerced, type=arrow_type)
+
+
+class Uncached:
+    """A computed value ResultCache.get_or_compute hands back without storing it.
+
+    Used for fallback data returned after a transient error (e.g. PoolTimeoutError), so
+    one overload spike is not served to every client for the whole TTL.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+
+class ResultCache:
+    """In-process LRU cache of endpoint results with a TTL and a data generation.
+
+    Every entry remembers the generation it was computed under; ``bump_generation``
+    (called after each successful import) makes all older entries stale at once.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 30.0) -> None:
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def bump_generation(self) -> int:
+        with self._lock:
+            self.generation += 1
+            return self.generation
+
+    def get(self, key: Any) -> tuple:
+        """Return ``(found, value)``."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, generation, value = entry
+                if generation != self.generation:
+                    self.invalidations += 1
+                elif expires_at < now:
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Any, value: Any, generation: int | None = None, ttl: float | None = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return  # computed against data that has since changed
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), self.generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Any, compute: Callable[[], Any], ttl: float | None = None) -> Any:
+        found, value = self.get(key)
+        if found:
+            return value
+        generation = self.generation
+        value = compute()
+        if isinstance(value, Uncached):
+            return value.value
+        self.put(key, value, generation, ttl)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class QueryCache:
+    """LRU of ad-hoc SQL statements plus per-fingerprint run statistics.
+
+    An entry remembers the validated query (or the validation error) for one exact
+    SQL text, so repeated runs skip the guards, and its last result set when that had
+    at most ``max_rows`` rows. A result is served again only while the data generation
+    it was read under is still current and for at most ``ttl`` seconds (writes made
+    outside the server do not bump the generation). Runs are aggregated by
+    fingerprint: the normalized SQL with literals replaced by ``?``.
+    """
+
+    TOKEN_RE = re.compile(
+        r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.S | re.I
+    )
+    LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+    def __init__(
+        self, max_entries: int = 256, max_rows: int = 5000, ttl: float = 30.0, max_fingerprints: int = 500
+    ) -> None:
+        self.max_entries = max(1, max_entries)
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.max_fingerprints = max(1, max_fingerprints)
+        self._entries: OrderedDict = OrderedDict()
+        self._fingerprints: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.statement_hits = 0
+        self.statement_misses = 0
+        self.result_hits = 0
+        self.result_misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def fingerprint(cls, sql: str) -> str:
+        def literal(match: re.Match) -> str:
+            token = match.group(0)
+            if token[0] == '"':
+                return token  # quoted identifier
+            if token[0] in "-/":
+                return " "  # comment
+            return "?"
+
+        normalized = cls.LIST_RE.sub("(?)", cls.TOKEN_RE.sub(literal, sql))
+        return " ".join(normalized.split()).lower()
+
+    def statement(self, key: Any) -> Dict[str, Any] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.statement_misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.statement_hits += 1
+            return entry
+
+    def add_statement(self, key: Any, query: str | None, error: str | None) -> Dict[str, Any]:
+        entry = {"query": query, "error": error, "fingerprint": self.fingerprint(query or key[0]), "result": None}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def result(self, entry: Dict[str, Any], generation: int) -> tuple | None:
+        """``(columns, rows)`` read under ``generation``, else None."""
+        now = time.monotonic()
+        with self._lock:
+            result = entry["result"]
+            if result is not None and result[0] == generation and result[1] > now:
+                self.result_hits += 1
+                return result[2], result[3]
+            self.result_misses += 1
+            return None
+
+    def store_result(self, entry: Dict[str, Any], generation: int, columns: List[str], rows: List[tuple]) -> None:
+        with self._lock:
+            entry["result"] = (generation, time.monotonic() + self.ttl, columns, rows)
+
+    def record(self, fingerprint: str, seconds: float, rows: int = 0, cached: bool = False, error: bool = False) -> None:
+        with self._lock:
+            stats = self._fingerprints.get(fingerprint)
+            if stats is None:
+                stats = self._fingerprints[fingerprint] = {
+                    "fingerprint": fingerprint,
+                    "count": 0,
+                    "cached": 0,
+                    "errors": 0,
+                    "rows": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                }
+                while len(self._fingerprints) > self.max_fingerprints:
+                    self._fingerprints.popitem(last=False)
+            else:
+                self._fingerprints.move_to_end(fingerprint)
+            elapsed_ms = seconds * 1000
+            stats["count"] += 1
+            stats["cached"] += int(cached)
+            stats["errors"] += int(error)
+            stats["rows"] += rows
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def top(self, limit: int = 20, by: str = "count") -> List[Dict[str, Any]]:
+        """Most frequent (``by="count"``) or most expensive (``by="total_ms"``) fingerprints."""
+        with self._lock:
+            rows = [dict(stats) for stats in self._fingerprints.values()]
+        rows.sort(key=lambda stats: stats[by], reverse=True)
+        for stats in rows[:limit]:
+            stats["avg_ms"] = round(stats["total_ms"] / stats["count"], 3)
+            stats["total_ms"] = round(stats["total_ms"], 3)
+            stats["max_ms"] = round(stats["max_ms"], 3)
+        return rows[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_rows": self.max_rows,
+                "ttl_seconds": self.ttl,
+                "fingerprints": len(self._fingerprints),
+                "statement_hits": self.statement_hits,
+                "statement_misses": self.statement_misses,
+                "result_hits": self.result_hits,
+                "result_misses": self.result_misses,
+                "evictions": self.evictions,
+            }
+
+
+def log_linear_bounds(min_exp: int, max_exp: int, sub_buckets: int) -> List[float]:
+    """Upper bounds splitting each ``[2**(e-1), 2**e)`` into ``sub_buckets`` equal steps."""
+    return [
+        2.0 ** exp * (0.5 + (sub + 1) / (2 * sub_buckets))
+        for exp in range(min_exp, max_exp + 1)
+        for sub in range(sub_buckets)
+    ]
+
+
+class LatencyHistogram:
+    """HDR-style log-linear latency histogram (seconds).
+
+    Every power of two between 2**(MIN_EXP-1) and 2**MAX_EXP (61 µs .. 64 s) is split
+    into SUB_BUCKETS linear buckets, so a bucket bound is within 1/SUB_BUCKETS of any
+    value in it; ``observe`` is one ``frexp`` and a list increment.
+    """
+
+    MIN_EXP = -13
+    MAX_EXP = 6
+    SUB_BUCKETS = 2
+    BOUNDS = log_linear_bounds(MIN_EXP, MAX_EXP, SUB_BUCKETS)
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.BOUNDS) + 1)  # last slot: above the largest bound
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        if seconds > 0:
+            mantissa, exp = math.frexp(seconds)
+            index = (exp - self.MIN_EXP) * self.SUB_BUCKETS + int((mantissa - 0.5) * 2 * self.SUB_BUCKETS)
+            index = min(max(index, 0), len(self.BOUNDS))
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def prometheus(self, name: str, labels: str) -> List[str]:
+        """``_bucket``/``_sum``/``_count`` lines; ``labels`` is the rendered ``k="v",...`` list."""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+def prometheus_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Request and SQL instrumentation, served at /api/_metrics in Prometheus text format.
+
+    Requests are grouped by route (path parameters folded to ``*``), SQL by QueryCache
+    fingerprint (at most ``max_fingerprints``, the rest count as ``other``). A query
+    slower than ``slow_query_ms`` is kept in a ring buffer together with its
+    ``EXPLAIN QUERY PLAN``, taken on the connection that ran it.
+    """
+
+    # routes whose tail is a parameter; longest first so /api/data/import/jobs wins over /api/data/import/
+    ROUTE_PREFIXES = (
+        "/api/orders/drilldown/",
+        "/api/orders-stats/day/",
+        "/api/orders/day/",
+        "/api/douyin/day/",
+        "/api/data/sample/",
+        "/api/data/import/",
+        "/api/export/",
+        "/api/cursor/",
+        "/api/query/",
+    )
+    MAX_ROUTES = 100
+    ROUTES = frozenset(
+        (
+            "/",
+            "/api/query",
+            "/api/data/import",
+            "/api/data/import/jobs",
+        )
+    )
+
+    def __init__(self, slow_query_ms: float = 200.0, slow_log_size: int = 50, max_fingerprints: int = 100) -> None:
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.max_fingerprints = max_fingerprints
+        self._requests: Dict[tuple, Dict[str, Any]] = {}
+        self._sql: Dict[str, Dict[str, Any]] = {}
+        self._fingerprint_of: Dict[str, str] = {}
+        self.slow_queries: deque = deque(maxlen=slow_log_size)
+        self.slow_total = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def route_label(cls, path: str) -> str:
+        path = path.split("?", 1)[0]
+        if path in cls.ROUTES:
+            return path
+        for prefix in cls.ROUTE_PREFIXES:
+            if path.startswith(prefix):
+                return prefix + "*"
+        return path if path.startswith("/api/") else "static"
+
+    def observe_request(self, method: str, path: str, status: int, seconds: float, response_bytes: int) -> None:
+        key = (self.route_label(path), method)
+        with self._lock:
+            series = self._requests.get(key)
+            if series is None:
+                if len(self._requests) >= self.MAX_ROUTES:
+                    key = ("/api/other", method)  # unknown paths must not add series without bound
+                    series = self._requests.get(key)
+                if series is None:
+                    series = self._requests[key] = {"latency": LatencyHistogram(), "statuses": {}, "bytes": 0}
+            series["latency"].observe(seconds)
+            series["statuses"][status] = series["statuses"].get(status, 0) + 1
+            series["bytes"] += response_bytes
+
+    def fingerprint(self, query: str) -> str:
+        fingerprint = self._fingerprint_of.get(query)
+        if fingerprint is None:
+            fingerprint = QueryCache.fingerprint(query)
+            if len(self._fingerprint_of) >= 4096:
+                self._fingerprint_of.clear()  # ad-hoc SQL must not grow this without bound
+            self._fingerprint_of[query] = fingerprint
+        return fingerprint
+
+    def observe_sql(
+        self,
+        query: str,
+        seconds: float,
+        rows: int,
+        conn: sqlite3.Connection | None = None,
+        params: tuple | None = None,
+    ) -> None:
+        fingerprint = self.fingerprint(query)
+        with self._lock:
+            series = self._sql.get(fingerprint)
+            if series is None:
+                if len(self._sql) >= self.max_fingerprints:
+                    fingerprint = "other"
+                    series = self._sql.get(fingerprint)
+                if series is None:
+                    series = self._sql[fingerprint] = {
+                        "id": hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12],
+                        "latency": LatencyHistogram(),
+                        "rows": 0,
+                    }
+            series["latency"].observe(seconds)
+            series["rows"] += rows
+        if seconds >= self.slow_query_seconds:
+            self.record_slow(query, seconds, rows, conn, params)
+
+    def record_slow(
+        self, query: str, seconds: float, rows: int, conn: sqlite3.Connection | None, params: tuple | None
+    ) -> None:
+        fingerprint = self.fingerprint(query)
+        plan: List[str] = []
+        if conn is not None:
+            try:
+                depth: Dict[int, int] = {}
+                for node_id, parent, _, detail in conn.execute("EXPLAIN QUERY PLAN " + query, params or ()):
+                    depth[node_id] = depth.get(parent, -1) + 1
+                    plan.append("  " * depth[node_id] + detail)
+            except sqlite3.Error as exc:
+                plan.append(f"EXPLAIN 失败: {exc}")
+        entry = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "fingerprint": fingerprint,
+            "query_id": hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12],
+            "sql": query,
+            "params": list(params) if params else [],
+            "plan": plan,
+        }
+        with self._lock:
+            self.slow_queries.append(entry)
+            self.slow_total += 1
+
+    def slow_log(self) -> List[Dict[str, Any]]:
+        """Slow queries, newest first."""
+        with self._lock:
+            return list(reversed(self.slow_queries))
+
+    def render(self) -> str:
+        lines = [
+            "# HELP dataweave_http_requests_total HTTP requests by route, method and status.",
+            "# TYPE dataweave_http_requests_total counter",
+        ]
+        with self._lock:
+            requests = sorted(self._requests.items())
+            for (route, method), series in requests:
+                for status, count in sorted(series["statuses"].items()):
+                    lines.append(
+                        f'dataweave_http_requests_total{{route="{prometheus_label(route)}",method="{method}",'
+                        f'status="{status}"}} {count}'
+                    )
+            lines += [
+                "# HELP dataweave_http_request_duration_seconds Time from reading the request to the last byte written.",
+                "# TYPE dataweave_http_request_duration_seconds histogram",
+            ]
+            for (route, method), series in requests:
+                labels = f'route="{prometheus_label(route)}",method="{method}"'
+                lines += series["latency"].prometheus("dataweave_http_request_duration_seconds", labels)
+            lines += [
+                "# HELP dataweave_http_response_bytes_total Serialized (uncompressed) JSON bytes written.",
+                "# TYPE dataweave_http_response_bytes_total counter",
+            ]
+            for (route, method), series in requests:
+                lines.append(
+                    f'dataweave_http_response_bytes_total{{route="{prometheus_label(route)}",method="{method}"}} '
+                    f'{series["bytes"]}'
+                )
+            # series carry a short query_id; the fingerprint text appears once, in the info metric
+            queries = sorted(self._sql.items())
+            lines += [
+                "# HELP dataweave_sql_fingerprint_info Normalized SQL of each query_id.",
+                "# TYPE dataweave_sql_fingerprint_info gauge",
+            ]
+            for fingerprint, series in queries:
+                lines.append(
+                    f'dataweave_sql_fingerprint_info{{query_id="{series["id"]}",'
+                    f'fingerprint="{prometheus_label(fingerprint)}"}} 1'
+                )
+            lines += [
+                "# HELP dataweave_sql_duration_seconds SQLite execute and fetch time per query fingerprint.",
+                "# TYPE dataweave_sql_duration_seconds histogram",
+            ]
+            for fingerprint, series in queries:
+                lines += series["latency"].prometheus("dataweave_sql_duration_seconds", f'query_id="{series["id"]}"')
+            lines += [
+                "# HELP dataweave_sql_rows_total Rows returned per query fingerprint.",
+                "# TYPE dataweave_sql_rows_total counter",
+            ]
+            for fingerprint, series in queries:
+                lines.append(f'dataweave_sql_rows_total{{query_id="{series["id"]}"}} {series["rows"]}')
+            lines += [
+                "# HELP dataweave_sql_slow_queries_total Queries slower than the slow-query threshold.",
+                "# TYPE dataweave_sql_slow_queries_total counter",
+                f"dataweave_sql_slow_queries_total {self.slow_total}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class StackSampler:
+    """Samples one thread's Python stack every ``interval`` seconds into collapsed stacks.
+
+    The output (``frame;frame;frame count`` per line) feeds flamegraph.pl or speedscope.
+    Samples are taken by a helper thread, so the real rate is bounded by the GIL switch
+    interval when the sampled thread is CPU bound.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class ProfileStore:
+    """Opt-in per-request profiles (请求级性能剖析) kept in a bounded directory.
+
+    A request from a ``trusted`` client that sends ``X-Profile: 1`` (or ``?profile=1``)
+    runs under cProfile; ``sample`` uses a StackSampler instead. Each profile is written
+    as ``<id>.json`` (request, timing, top functions) plus ``<id>.pstats`` and
+    ``<id>.txt`` or ``<id>.folded``; only the newest ``max_profiles`` are kept.
+    """
+
+    MODES = {"1": "cprofile", "cprofile": "cprofile", "sample": "sample"}
+    FORMATS = {"txt": "text/plain", "folded": "text/plain", "pstats": "application/octet-stream"}
+
+    def __init__(
+        self,
+        directory: str = "profiles",
+        max_profiles: int = 50,
+        trusted: Any = ("127.0.0.1/32", "::1/128"),
+        sample_interval: float = 0.001,
+    ) -> None:
+        self.directory = directory
+        self.max_profiles = max(1, max_profiles)
+        self.trusted_networks = [ipaddress.ip_network(network, strict=False) for network in trusted]
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+
+    def is_trusted(self, client_ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(client_ip)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_networks)
+
+    def start(self, mode: str) -> Dict[str, Any] | None:
+        """Begin profiling the calling thread; pass the result to ``finish``.
+
+        None when cProfile refuses to start because another profiler is active.
+        """
+        session = {
+            # sortable by time, which is what _trim and latest rely on
+            "id": datetime.now().strftime("%Y%m%d-%H%M%S-%f-") + uuid.uuid4().hex[:4],
+            "mode": mode,
+            "started": time.perf_counter(),
+        }
+        if mode == "sample":
+            session["sampler"] = StackSampler(threading.get_ident(), self.sample_interval)
+        else:
+            session["profile"] = profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                return None
+        return session
+
+    def finish(self, session: Dict[str, Any], meta: Dict[str, Any]) -> str:
+        """Stop profiling, write the files and trim the directory; returns the profile id."""
+        if session["mode"] == "sample":
+            session["sampler"].stop()
+        else:
+            session["profile"].disable()
+        meta = {
+            "id": session["id"],
+            "mode": session["mode"],
+            "created": datetime.now().isoformat(timespec="seconds"),
+            **meta,
+            "ms": round((time.perf_counter() - session["started"]) * 1000, 3),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, session["id"])
+        if session["mode"] == "sample":
+            sampler = session["sampler"]
+            with open(base + ".folded", "w", encoding="utf-8") as fh:
+                fh.write(sampler.collapsed())
+            leaves = Counter()
+            for stack, count in sampler.counts.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            meta["samples"] = sum(sampler.counts.values())
+            meta["top"] = [{"function": name, "samples": count} for name, count in leaves.most_common(10)]
+            meta["files"] = ["folded"]
+        else:
+            profile = session["profile"]
+            profile.dump_stats(base + ".pstats")
+            text = io.StringIO()
+            pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(60)
+            with open(base + ".txt", "w", encoding="utf-8") as fh:
+                fh.write(text.getvalue())
+            rows = sorted(pstats.Stats(profile).stats.items(), key=lambda item: item[1][2], reverse=True)
+            meta["top"] = [
+                {
+                    "function": f"{func} ({os.path.basename(filename)}:{line})",
+                    "calls": calls,
+                    "tottime_ms": round(tottime * 1000, 3),
+                    "cumtime_ms": round(cumtime * 1000, 3),
+                }
+                for (filename, line, func), (_, calls, tottime, cumtime, _) in rows[:10]
+            ]
+            meta["files"] = ["txt", "pstats"]
+        with open(base + ".json", "w", encoding="utf-8") as fh:
+            json.dump(meta, fh, ensure_ascii=False)
+        self._trim()
+        return session["id"]
+
+    def _trim(self) -> None:
+        with self._lock:
+            indexes = sorted(glob.glob(os.path.join(self.directory, "*.json")))
+            for index in indexes[: max(0, len(indexes) - self.max_profiles)]:
+                for path in glob.glob(index[: -len(".json")] + ".*"):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:  # a concurrent trim got there first
+                        pass
+
+    def latest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Newest profiles first (their ``.json`` metadata)."""
+        profiles = []
+        for index in sorted(glob.glob(os.path.join(self.directory, "*.json")), reverse=True)[:limit]:
+            try:
+                with open(index, encoding="utf-8") as fh:
+                    profiles.append(json.load(fh))
+            except (OSError, ValueError):
+                continue  # trimmed or half-written
+        return profiles
+
+    def path(self, profile_id: str, fmt: str) -> str | None:
+        if fmt not in self.FORMATS or not re.fullmatch(r"[0-9A-Za-z-]+", profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{fmt}")
+        return path if os.path.exists(path) else None
+
+
+class TokenBucketLimiter:
+    """Server-wide per-client token bucket (防“侏儒攻击”/小流量猛烈重复请求).
+
+    Each key holds ``[tokens, last_seen]``; a check refills by elapsed time and spends
+    one token, so it is O(1) regardless of the window. Keys are kept in LRU order and
+    capped at ``max_keys``; a background sweeper drops buckets that have been idle long
+    enough to be full again, which is indistinguishable from never having seen them.
+    """
+
+    def __init__(
+        self,
+        max_requests: int = 120,
+        window: float = 60.0,
+        max_keys: int = 100_000,
+        sweep_interval: float | None = 30.0,
+    ) -> None:
+        self.capacity = float(max(1, max_requests))
+        self.refill_per_second = self.capacity / window
+        self.idle_ttl = window
+        self.max_keys = max_keys
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+        self._stop = threading.Event()
+        if sweep_interval:
+            threading.Thread(target=self._sweep_loop, args=(sweep_interval,), name="rate-limit-sweeper", daemon=True).start()
+
+    def check(self, key: str) -> tuple:
+        """Spend one token for ``key``; return ``(allowed, retry_after_seconds)``."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+                bucket = self._buckets[key] = [self.capacity, now]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                self.allowed += 1
+                return True, 0.0
+            self.limited += 1
+            return False, (1.0 - bucket[0]) / self.refill_per_second
+
+    def evict_idle(self) -> int:
+        """Drop buckets idle for at least one full window; returns how many were removed."""
+        cutoff = time.monotonic() - self.idle_ttl
+        removed = 0
+        with self._lock:
+            while self._buckets:
+                key, bucket = next(iter(self._buckets.items()))
+                if bucket[1] > cutoff:
+                    break
+                del self._buckets[key]
+                removed += 1
+            self.evicted += removed
+        return removed
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracked_clients": len(self._buckets),
+                "max_clients": self.max_keys,
+                "allowed": self.allowed,
+                "limited": self.limited,
+                "evicted": self.evicted,
+            }
+
+
+class ImportJobManager:
+    """Background CSV import jobs (后台导入任务).
+
+    The request thread spools the upload to a temp file and queues it; one worker thread
+    (SQLite has a single writer anyway) feeds queued files to ``DataAnalyzer.import_stream``
+    and records progress per chunk. Finished jobs are kept in a bounded history.
+    """
+
+    def __init__(
+        self,
+        analyzer: "DataAnalyzer",
+        max_pending: int = 16,
+        max_history: int = 100,
+        spool_dir: str | None = None,
+    ) -> None:
+        self.analyzer = analyzer
+        self.max_history = max_history
+        self.spool_dir = spool_dir
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._jobs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="import-worker", daemon=True)
+        self._worker.start()
+
+    def spool(self, source: Any) -> tuple:
+        """Copy a binary stream into a temp file; returns ``(path, size_in_bytes)``."""
+        fd, path = tempfile.mkstemp(prefix="dataweave-import-", suffix=".csv", dir=self.spool_dir)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                shutil.copyfileobj(source, fh, 1 << 20)
+                size = fh.tell()
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, size
+
+    def submit(
+        self, table_name: str, path: str, size: int, chunk_size: int = 10000, mode: str = "append"
+    ) -> Dict[str, Any] | None:
+        """Queue a spooled file; returns the job, or None (file removed) when the queue is full."""
+        job = {
+            "job_id": uuid.uuid4().hex[:16],
+            "table_name": table_name,
+            "status": "queued",
+            "mode": mode,
+            "bytes": size,
+            "chunk_size": chunk_size,
+            "rows_parsed": 0,
+            "rows_written": 0,
+            "inserted": 0,
+            "updated": 0,
+            "skipped": 0,
+            "rejected": 0,
+            "rejected_rows": [],
+            "chunks": 0,
+            "error": None,
+            "message": None,
+            "submitted_at": datetime.now().isoformat(timespec="seconds"),
+            "started_at": None,
+            "finished_at": None,
+            "_path": path,
+            "_started": None,
+            "_finished": None,
+        }
+        with self._lock:
+            try:
+                self._queue.put_nowait(job["job_id"])
+            except queue.Full:
+                os.remove(path)
+                return None
+            self._jobs[job["job_id"]] = job
+        return self._snapshot(job)
+
+    def get(self, job_id: str) -> Dict[str, Any] | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job is not None else None
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """All known jobs, newest first."""
+        with self._lock:
+            return [self._snapshot(job) for job in reversed(self._jobs.values())]
+
+    def _snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        data = {k: v for k, v in job.items() if not k.startswith("_")}
+        if job["_started"] is not None:
+            elapsed = (job["_finished"] or time.monotonic()) - job["_started"]
+            data["seconds"] = round(elapsed, 3)
+            data["rows_per_sec"] = round(job["rows_written"] / elapsed) if elapsed > 0 else 0
+        return data
+
+    def _run(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job = self._jobs[job_id]
+                job["status"] = "running"
+                job["started_at"] = datetime.now().isoformat(timespec="seconds")
+                job["_started"] = time.monotonic()
+            try:
+                with open(job["_path"], "r", encoding="utf-8-sig", newline="") as fh:
+                    result = self.analyzer.import_stream(
+                        job["table_name"],
+                        fh,
+                        job["chunk_size"],
+                        progress=lambda info: self._progress(job, info),
+                        mode=job["mode"],
+                    )
+            except Exception as exc:  # pragma: no cover - defensive
+                result = {"success": False, "error": f"导入失败: {exc}"}
+            finally:
+                try:
+                    os.remove(job["_path"])
+                except OSError:
+                    pass  # a leftover temp file must not stop the worker: later jobs would stay queued
+            with self._lock:
+                job["status"] = "succeeded" if result.get("success") else "failed"
+                job["rows_parsed"] = result.get("rows_parsed", job["rows_parsed"])
+                job["rows_written"] = result.get("rows", job["rows_written"])
+                for key in ("inserted", "updated", "skipped", "rejected", "rejected_rows"):
+                    job[key] = result.get(key, job[key])
+                job["error"] = result.get("error")
+                job["message"] = result.get("message")
+                job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+                job["_finished"] = time.monotonic()
+                self._trim_history()
+
+    def _progress(self, job: Dict[str, Any], info: Dict[str, Any]) -> None:
+        with self._lock:
+            job["rows_parsed"] = info["rows_parsed"]
+            job["rows_written"] = info["total_rows"]
+            job["chunks"] = info["chunk"]
+            for key in ("inserted", "updated", "skipped", "rejected"):
+                job[key] += info[key]
+
+    def _trim_history(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job["_finished"] is not None]
+        for job_id in finished[: max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the worker after the jobs already queued."""
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+
+class CursorManager:
+    """Server-side cursors for the POST SQL tool (服务端游标分页).
+
+    Each cursor owns a read-only connection from a pool of its own (holding one from the
+    read pool for minutes would starve the endpoints) and is read page by page with
+    ``fetchmany``, every page under a fresh QueryGuard budget. A client may hold at most
+    ``max_per_client`` cursors and the server ``max_cursors``; a sweeper closes cursors
+    idle for longer than ``ttl``. An open cursor pins a WAL read snapshot, so keep the
+    TTL short.
+    """
+
+    MAX_PAGE_SIZE = 5000
+
+    def __init__(
+        self,
+        analyzer: "DataAnalyzer",
+        ttl: float = 60.0,
+        max_per_client: int = 4,
+        max_cursors: int = 64,
+        sweep_interval: float | None = 10.0,
+    ) -> None:
+        self.analyzer = analyzer
+        self.ttl = ttl
+        self.max_per_client = max(1, max_per_client)
+        self.max_cursors = max(1, max_cursors)
+        self._pool = ConnectionPool(analyzer.db.db_path, size=self.max_cursors, wait_timeout=0, read_only=True)
+        self._cursors: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.exhausted = 0
+        self.reaped = 0
+        self.limited = 0
+        self._stop = threading.Event()
+        if sweep_interval:
+            threading.Thread(target=self._sweep_loop, args=(sweep_interval,), name="cursor-reaper", daemon=True).start()
+
+    def open(self, client: str, sql_query: str, page_size: int = 500) -> Dict[str, Any]:
+        """Validate and run ``sql_query``; returns the first page (``cursor_id`` is None when it was the last).
+
+        Goes through the analyzer's QueryCache like GET /api/query/: the validated
+        statement is reused, and a result that fit in a single page is replayed without
+        opening a cursor while the data generation it was read under is current.
+        """
+        started = time.perf_counter()
+        query_cache = self.analyzer.query_cache
+        key = (sql_query.strip(), None)  # row_limit None: unlimited POST statements, never shared with GET
+        entry = query_cache.statement(key)
+        if entry is None:
+            entry = query_cache.add_statement(
+                key,
+                *self.analyzer.validate_custom_query(sql_query, row_limit=None, max_length=DataAnalyzer.MAX_POST_SQL_LENGTH),
+            )
+        if entry["error"]:
+            return {"error": entry["error"]}
+        query = entry["query"]
+        page_size = max(1, min(page_size, self.MAX_PAGE_SIZE))
+        generation = self.analyzer.cache.generation if self.analyzer.cache is not None else None
+
+        cached = query_cache.result(entry, generation) if generation is not None else None
+        if cached is not None and len(cached[1]) <= page_size:
+            columns, rows = cached
+            query_cache.record(entry["fingerprint"], time.perf_counter() - started, len(rows), cached=True)
+            return {
+                "cursor_id": None,
+                "columns": columns,
+                "data": rows,
+                "offset": 0,
+                "rows": len(rows),
+                "has_more": False,
+                "expires_in": None,
+            }
+
+        session = {
+            "cursor_id": uuid.uuid4().hex,
+            "client": client,
+            "conn": None,
+            "cursor": None,
+            "columns": [],
+            "pending": [],
+            "query": query,
+            "rows_fetched": 0,
+            "pages": 0,
+            "last_used": time.monotonic(),
+            "lock": threading.Lock(),
+        }
+        with self._lock:
+            if sum(1 for other in self._cursors.values() if other["client"] == client) >= self.max_per_client:
+                self.limited += 1
+                raise CursorLimitError(f"每个客户端最多同时打开 {self.max_per_client} 个游标，请先读完或关闭已有游标")
+            if len(self._cursors) >= self.max_cursors:
+                self.limited += 1
+                raise CursorLimitError("服务器游标数已达上限，请稍后重试")
+            self._cursors[session["cursor_id"]] = session
+
+        guard = self.analyzer.query_guard
+        with session["lock"]:
+            budget = None
+            try:
+                conn = session["conn"] = self._pool.acquire()
+                guard.check_plan(conn, query)
+                budget = guard.begin(conn)
+                cursor = session["cursor"] = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(query)
+            except Exception as exc:
+                if budget is not None:
+                    QueryGuard.end(conn)
+                self._close(session)
+                return {"error": str(budget.error() if budget is not None and budget.reason else exc)}
+            QueryGuard.end(conn)
+            with self._lock:
+                self.opened += 1
+            session["columns"] = [d[0] for d in cursor.description or ()]
+            page = self._page(session, page_size)
+        if "error" not in page:
+            query_cache.record(entry["fingerprint"], time.perf_counter() - started, page["rows"])
+            if generation is not None and not page["has_more"] and page["rows"] <= query_cache.max_rows:
+                query_cache.store_result(entry, generation, page["columns"], page["data"])
+        return page
+
+    def fetch(self, client: str, cursor_id: str, page_size: int = 500) -> Dict[str, Any] | None:
+        """Next page of an open cursor; None when it is unknown, expired or not ``client``'s."""
+        with self._lock:
+            session = self._cursors.get(cursor_id)
+            if session is None or session["client"] != client:
+                return None
+            session["last_used"] = time.monotonic()
+        with session["lock"]:
+            if session["conn"] is None:  # reaped or exhausted meanwhile
+                return None
+            return self._page(session, page_size)
+
+    def discard(self, client: str, cursor_id: str) -> bool:
+        with self._lock:
+            session = self._cursors.get(cursor_id)
+            if session is None or session["client"] != client:
+                return False
+        with session["lock"]:
+            self._close(session)
+        return True
+
+    def _page(self, session: Dict[str, Any], page_size: int) -> Dict[str, Any]:
+        """Read one page; the caller holds the session lock. One extra row tells whether more follow."""
+        page_size = max(1, min(page_size, self.MAX_PAGE_SIZE))
+        conn = session["conn"]
+        budget = self.analyzer.query_guard.begin(conn)
+        started = time.perf_counter()
+        try:
+            rows = session["pending"] + session["cursor"].fetchmany(page_size + 1 - len(session["pending"]))
+        except Exception as exc:
+            # any failure (cancelled, DatabaseError, undecodable text) ends the cursor so it
+            # does not hold its connection and WAL snapshot until the reaper runs
+            QueryGuard.end(conn)
+            self._close(session)
+            return {"error": str(budget.error() if budget.reason else exc)}
+        QueryGuard.end(conn)
+        if self.analyzer.metrics is not None:
+            self.analyzer.metrics.observe_sql(session["query"], time.perf_counter() - started, len(rows), conn)
+        has_more = len(rows) > page_size
+        session["pending"] = rows[page_size:]
+        rows = rows[:page_size]
+        offset = session["rows_fetched"]
+        session["rows_fetched"] += len(rows)
+        session["pages"] += 1
+        session["last_used"] = time.monotonic()
+        if not has_more:
+            self._close(session)
+            with self._lock:
+                self.exhausted += 1
+        return {
+            "cursor_id": session["cursor_id"] if has_more else None,
+            "columns": session["columns"],
+            "data": rows,
+            "offset": offset,
+            "rows": len(rows),
+            "has_more": has_more,
+            "expires_in": self.ttl if has_more else None,
+        }
+
+    def _close(self, session: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cursors.pop(session["cursor_id"], None)
+        if session["cursor"] is not None:
+            session["cursor"].close()
+            session["cursor"] = None
+        if session["conn"] is not None:
+            self._pool.release(session["conn"])  # rolls back the read transaction, releasing the snapshot
+            session["conn"] = None
+
+    def reap(self) -> int:
+        """Close cursors idle for longer than ``ttl``; returns how many were closed."""
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            idle = [session for session in self._cursors.values() if session["last_used"] < cutoff]
+        reaped = 0
+        for session in idle:
+            if not session["lock"].acquire(blocking=False):
+                continue  # a page is being read right now
+            try:
+                if session["conn"] is not None:
+                    self._close(session)
+                    reaped += 1
+            finally:
+                session["lock"].release()
+        with self._lock:
+            self.reaped += reaped
+        return reaped
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.reap()
+
+    def close(self) -> None:
+        """Stop the sweeper and close every open cursor."""
+        self._stop.set()
+        with self._lock:
+            sessions = list(self._cursors.values())
+        for session in sessions:
+            with session["lock"]:
+                self._close(session)
+        self._pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": len(self._cursors),
+                "max_cursors": self.max_cursors,
+                "max_per_client": self.max_per_client,
+                "ttl_seconds": self.ttl,
+                "opened": self.opened,
+                "exhausted": self.exhausted,
+                "reaped": self.reaped,
+                "limited": self.limited,
+            }
+
+
+def cached_result(method: Callable) -> Callable:
+    """Cache a DataAnalyzer method's return value in ``self.cache``, keyed by name and arguments.
+
+    A method returns ``Uncached(value)`` for results that must not be cached.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            value = method(self, *args, **kwargs)
+            return value.value if isinstance(value, Uncached) else value
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        return self.cache.get_or_compute(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
+
+
+def day_bounds(day: str) -> tuple:
+    """Half-open ``[day, next day)`` bounds as ISO strings for range scans on order_date.
+
+    order_date is stored as ``YYYY-MM-DD HH:MM:SS`` text, so plain string comparison
+    against date prefixes is equivalent to the old ``datetime(...)`` predicates but can
+    use ``idx_orders_order_date``.
+    """
+    start = datetime.strptime(day.strip()[:10], "%Y-%m-%d")
+    return start.strftime("%Y-%m-%d"), (start + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque page token for keyset pagination (URL-safe base64 of a JSON list)."""
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("cursor 无效") from exc
+    if not isinstance(values, list):
+        raise ValueError("cursor 无效")
+    return values
+
+
+def parse_numbers(raw: pd.Series) -> pd.Series:
+    """``pd.to_numeric(raw, errors="coerce")`` as float64 for a column of CSV strings.
+
+    A column that is entirely valid (the common case) is cast by Arrow in one pass, about
+    20x faster than to_numeric; any bad value falls back to to_numeric, which marks it NaN.
+    """
+    if pc is not None:
+        try:
+            return pd.Series(
+                pc.cast(pa.array(raw, from_pandas=True), pa.float64()).to_numpy(zero_copy_only=False),
+                index=raw.index,
+            )
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+    return pd.to_numeric(raw, errors="coerce").astype("float64")
+
+
+class DatabaseManager:
+    # CSV import key-conflict handling; see import_csv_stream
+    IMPORT_MODES = ("append", "upsert", "skip_existing")
+    # column -> (referenced table, key); checked by validate_chunk on import
+    FOREIGN_KEYS = {
+        "orders": {"user_id": ("users", "user_id")},
+        "order_items": {"order_id": ("orders", "order_id"), "product_id": ("products", "product_id")},
+    }
+    MAX_IMPORT_ERRORS = 100
+    # the only date/time text accepted on import: string ranges (day_bounds) and the
+    # rollup day key (first 10 characters) rely on this exact shape
+    DATE_TEXT_RE = r"\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?"
+    # (name, table, columns); created or rebuilt by ensure_indexes on startup
+    INDEXES = (
+        ("idx_orders_order_date", "orders", "order_date"),
+        ("idx_orders_user_id", "orders", "user_id"),
+        ("idx_order_items_order_id", "order_items", "order_id"),
+        ("idx_order_items_product_id", "order_items", "product_id"),
+    )
+
+    # Per-day order aggregates read by the dashboard instead of scanning orders.
+    # day is substr(order_date, 1, 10), the same text prefix day_bounds ranges select, so
+    # incremental refreshes and full rebuilds agree; order_date holds local wall-clock time.
+    ROLLUP_TABLES_SQL = (
+        """CREATE TABLE IF NOT EXISTS daily_order_rollup (
+            day TEXT NOT NULL,
+            status TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            order_count INTEGER NOT NULL,
+            sales_total REAL NOT NULL,
+            PRIMARY KEY (day, status, payment_method)
+        ) WITHOUT ROWID""",
+        # distinct paying users per day; COUNT(DISTINCT) is not additive across status rows
+        """CREATE TABLE IF NOT EXISTS daily_order_customers (
+            day TEXT NOT NULL,
+            cancelled INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            order_count INTEGER NOT NULL,
+            PRIMARY KEY (day, cancelled, user_id)
+        ) WITHOUT ROWID""",
+    )
+    # Per-order totals of order_items, kept in step with imports by refresh_item_summary
+    ITEM_SUMMARY_SQL = """CREATE TABLE IF NOT EXISTS order_item_summary (
+        order_id INTEGER PRIMARY KEY,
+        item_count INTEGER NOT NULL,
+        item_quantity INTEGER NOT NULL,
+        item_revenue REAL NOT NULL,
+        categories TEXT
+    )"""
+
+    def __init__(
+        self, db_path: str = "ecommerce.db", cache: ResultCache | None = None, metrics: Metrics | None = None
+    ) -> None:
+        self.db_path = db_path
+        # per-fingerprint SQL timings and the slow-query log; None disables them
+        self.metrics = metrics
+        self.allowed_tables = ("users", "products", "orders", "order_items")
+        # Result cache whose generation is bumped after every committed write
+        self.cache = cache
+        # Writers (schema bootstrap, CSV import) and readers use separate pools so a
+        # long SELECT never holds a connection the importer is waiting for.
+        self.pool = get_connection_pool(db_path, size=2)
+        self.ensure_database()
+        self.read_pool = get_connection_pool(db_path, read_only=True)
+        # Table/column lookups, shared with the Flask API and reloaded on schema_version changes
+        self.schema = get_schema_catalog(db_path)
+
     def ensure_database(self) -> None:
         """Create tables when missing and seed with demo data."""
-        conn = self.get_connection()
+        with self.pool.connection() as conn:
+            self._create_schema(conn)
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
         cursor = conn.cursor()
 
         tables_sql = [
@@ -76,13 +1825,130 @@ class DatabaseManager:
         for sql in tables_sql:
             cursor.execute(sql)
 
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'daily_order_rollup'")
+        rollup_missing = cursor.fetchone() is None
+        for sql in self.ROLLUP_TABLES_SQL:
+            cursor.execute(sql)
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'order_item_summary'")
+        summary_missing = cursor.fetchone() is None
+        cursor.execute(self.ITEM_SUMMARY_SQL)
+
         cursor.execute("SELECT COUNT(*) FROM users")
         user_count = cursor.fetchone()[0]
         if user_count == 0:
             self.insert_sample_data(cursor)
+        conn.commit()
+        self.ensure_indexes(conn)
+        if rollup_missing or user_count == 0:
+            self.refresh_rollup(conn)
+            conn.commit()
+        if summary_missing or user_count == 0:
+            self.refresh_item_summary(conn)
+            conn.commit()
+
+    def ensure_indexes(self, conn: sqlite3.Connection) -> List[str]:
+        """Create missing secondary indexes and rebuild ones whose definition changed."""
+        existing = {
+            row["name"]: row["sql"]
+            for row in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+        }
+        created = []
+        for name, table, columns in self.INDEXES:
+            sql = f"CREATE INDEX {name} ON {table}({columns})"
+            if existing.get(name) == sql:
+                continue
+            if name in existing:
+                conn.execute(f"DROP INDEX {name}")
+            conn.execute(sql)
+            created.append(table)
+        if created:
+            for table in sorted(set(created)):
+                conn.execute(f"ANALYZE {table}")
             conn.commit()
+        return created
+
+    def refresh_rollup(self, conn: sqlite3.Connection, days: Any = None) -> None:
+        """Recompute rollup rows for ``days`` (iterable of YYYY-MM-DD), or everything when None.
+
+        Runs inside the caller's transaction; the caller commits.
+        """
+        if days is None:
+            conn.execute("DELETE FROM daily_order_rollup")
+            conn.execute("DELETE FROM daily_order_customers")
+            # only rows whose first 10 characters form a real date get a day
+            where, params_list = "WHERE DATE(substr(order_date, 1, 10)) = substr(order_date, 1, 10)", [()]
+        else:
+            where = "WHERE order_date >= ? AND order_date < ?"
+            params_list = []
+            for day in sorted(set(days)):
+                try:
+                    start, end = day_bounds(str(day))
+                except ValueError:
+                    continue
+                conn.execute("DELETE FROM daily_order_rollup WHERE day = ?", (start,))
+                conn.execute("DELETE FROM daily_order_customers WHERE day = ?", (start,))
+                params_list.append((start, end))
+
+        for params in params_list:
+            conn.execute(
+                f"""
+                INSERT INTO daily_order_rollup (day, status, payment_method, order_count, sales_total)
+                SELECT substr(order_date, 1, 10), IFNULL(status, ''), IFNULL(payment_method, ''),
+                       COUNT(*), COALESCE(SUM(total_amount), 0)
+                FROM orders
+                {where}
+                GROUP BY 1, 2, 3
+                """,
+                params,
+            )
+            conn.execute(
+                f"""
+                INSERT INTO daily_order_customers (day, cancelled, user_id, order_count)
+                SELECT substr(order_date, 1, 10), IFNULL(status, '') = 'cancelled', user_id, COUNT(*)
+                FROM orders
+                {where} AND user_id IS NOT NULL
+                GROUP BY 1, 2, 3
+                """,
+                params,
+            )
 
-        conn.close()
+    def refresh_item_summary(self, conn: sqlite3.Connection, order_ids: Any = None) -> None:
+        """Recompute order_item_summary for ``order_ids``, or for every order when None.
+
+        Runs inside the caller's transaction; the caller commits.
+        """
+        if order_ids is None:
+            conn.execute("DELETE FROM order_item_summary")
+            where, params = "oi.order_id IS NOT NULL", ()
+        else:
+            # ids may arrive as numbers or as CSV text such as "900002.0"
+            ids = pd.to_numeric(pd.Series(list(order_ids), dtype=object), errors="coerce").dropna()
+            keys = json.dumps(sorted(set(ids.astype("int64").tolist())))
+            conn.execute("DELETE FROM order_item_summary WHERE order_id IN (SELECT value FROM json_each(?))", (keys,))
+            where, params = "oi.order_id IN (SELECT value FROM json_each(?))", (keys,)
+        conn.execute(
+            f"""
+            INSERT INTO order_item_summary (order_id, item_count, item_quantity, item_revenue, categories)
+            SELECT oi.order_id, COUNT(*), COALESCE(SUM(oi.quantity), 0),
+                   COALESCE(SUM(oi.quantity * oi.unit_price), 0), GROUP_CONCAT(DISTINCT p.category)
+            FROM order_items oi
+            LEFT JOIN products p ON oi.product_id = p.product_id
+            WHERE {where}
+            GROUP BY oi.order_id
+            """,
+            params,
+        )
+
+    def rebuild_rollup(self) -> Dict[str, Any]:
+        """Full rebuild of the daily rollup tables and the per-order item summary."""
+        started = time.perf_counter()
+        with self.pool.connection() as conn:
+            self.refresh_rollup(conn)
+            self.refresh_item_summary(conn)
+            conn.commit()
+            days = conn.execute("SELECT COUNT(DISTINCT day) FROM daily_order_rollup").fetchone()[0]
+        self.data_changed()
+        return {"success": True, "days": days, "seconds": round(time.perf_counter() - started, 3)}
 
     def insert_sample_data(self, cursor: sqlite3.Cursor) -> None:
         """Insert demo dataset for dashboard and query demos."""
@@ -149,78 +2015,517 @@ class DatabaseManager:
         return datetime.now() - timedelta(days=random.randint(0, days_back))
 
     def execute_query(self, query: str, params: tuple | None = None) -> List[Dict[str, Any]]:
-        """Execute a query and return rows as dict."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
+        """Execute a read query on the read-only pool and return rows as dict."""
+        with self.read_pool.connection() as conn:
+            started = time.perf_counter()
+            cursor = conn.cursor()
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
 
-        columns = [description[0] for description in cursor.description] if cursor.description else []
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()] if columns else []
-        conn.close()
+            columns = [description[0] for description in cursor.description] if cursor.description else []
+            results = [dict(zip(columns, row)) for row in cursor.fetchall()] if columns else []
+            if self.metrics is not None:
+                self.metrics.observe_sql(query, time.perf_counter() - started, len(results), conn, params)
         return results
 
+    def stream_query(
+        self,
+        query: str,
+        params: tuple | None = None,
+        batch_size: int = 500,
+        guard: QueryGuard | None = None,
+        keep_rows: int = 0,
+        on_complete: Callable[[QueryStream], None] | None = None,
+    ) -> QueryStream:
+        """Like execute_query, but rows are fetched lazily from the read-only pool."""
+        return QueryStream(
+            self.read_pool,
+            query,
+            params,
+            batch_size,
+            guard=guard,
+            keep_rows=keep_rows,
+            on_complete=on_complete,
+            metrics=self.metrics,
+        )
+
+    def export_stream(
+        self, table_name: str, date_from: str | None = None, date_to: str | None = None, batch_size: int = 65536
+    ) -> tuple:
+        """Return ``(QueryStream, [(column, declared_type), ...])`` for a bulk export.
+
+        ``date_from``/``date_to`` (inclusive days) are pushed down as a range on
+        orders.order_date; order_items is filtered through its order.
+        """
+        if table_name not in self.allowed_tables:
+            raise ValueError("不支持的表名")
+        columns = [(c["name"], (c["type"] or "").upper()) for c in self.get_table_info(table_name)]
+        select_list = ", ".join(f"t.{name}" for name, _ in columns)
+        if not date_from and not date_to:
+            return self.stream_query(f"SELECT {select_list} FROM {table_name} t", batch_size=batch_size), columns
+
+        start = day_bounds(date_from)[0] if date_from else "0000-01-01"
+        end = day_bounds(date_to)[1] if date_to else "9999-12-31"
+        if table_name == "orders":
+            sql = f"SELECT {select_list} FROM orders t WHERE t.order_date >= ? AND t.order_date < ?"
+        elif table_name == "order_items":
+            sql = (
+                f"SELECT {select_list} FROM orders o JOIN order_items t ON t.order_id = o.order_id "
+                "WHERE o.order_date >= ? AND o.order_date < ?"
+            )
+        else:
+            raise ValueError(f"{table_name} 没有 order_date，不支持 from/to 过滤")
+        return self.stream_query(sql, (start, end), batch_size=batch_size), columns
+
+    def schema_tables(self) -> Dict[str, List[Dict[str, Any]]]:
+        """``{table: columns}`` from the schema catalog; one PRAGMA schema_version per call."""
+        with self.read_pool.connection() as conn:
+            return self.schema.tables(lambda sql: conn.execute(sql).fetchall())
+
     def get_table_info(self, table_name: str) -> List[Dict[str, Any]]:
-        return self.execute_query(f"PRAGMA table_info({table_name})")
+        return [dict(column) for column in self.schema_tables().get(table_name, [])]
 
     def get_table_row_count(self, table_name: str) -> int:
         result = self.execute_query(f"SELECT COUNT(*) as count FROM {table_name}")
         return result[0]["count"] if result else 0
 
+    def data_changed(self) -> None:
+        """Invalidate cached results computed before the latest write."""
+        if self.cache is not None:
+            self.cache.bump_generation()
+
+    def table_has_rows(self, table_name: str) -> bool:
+        return bool(self.execute_query(f"SELECT 1 AS found FROM {table_name} LIMIT 1"))
+
     def get_all_tables(self) -> List[str]:
-        tables = self.execute_query("SELECT name FROM sqlite_master WHERE type='table'")
-        return [table["name"] for table in tables]
+        return list(self.schema_tables())
+
+    def import_csv_data(self, table_name: str, csv_content: str, mode: str = "append") -> Dict[str, Any]:
+        """Import CSV text (the JSON upload path) through the chunked importer."""
+        return self.import_csv_stream(table_name, io.StringIO(csv_content), mode=mode)
+
+    def primary_key(self, table_name: str) -> str | None:
+        for column in self.schema_tables().get(table_name, []):
+            if column["pk"]:
+                return column["name"]
+        return None
+
+    def build_import_sql(self, table_name: str, columns: List[str], mode: str, pk: str | None) -> str:
+        """INSERT for one CSV chunk; ``upsert`` only rewrites rows whose values actually differ."""
+        placeholders = ", ".join("?" for _ in columns)
+        sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+        if mode == "append":
+            return sql
+        updates = [col for col in columns if col != pk]
+        if mode == "skip_existing" or not updates:
+            return f"{sql} ON CONFLICT({pk}) DO NOTHING"
+        assignments = ", ".join(f"{col} = excluded.{col}" for col in updates)
+        changed = " OR ".join(f"{table_name}.{col} IS NOT excluded.{col}" for col in updates)
+        return f"{sql} ON CONFLICT({pk}) DO UPDATE SET {assignments} WHERE {changed}"
+
+    def load_reference_keys(self, conn: sqlite3.Connection, table_name: str, columns: List[str]) -> Dict[str, Any]:
+        """Sorted arrays of referenced keys for the FK columns present in the CSV, loaded once per import."""
+        keys = {}
+        for column, (ref_table, ref_column) in self.FOREIGN_KEYS.get(table_name, {}).items():
+            if column in columns:
+                cursor = conn.execute(f"SELECT {ref_column} FROM {ref_table} WHERE {ref_column} IS NOT NULL")
+                keys[column] = np.sort(np.fromiter((row[0] for row in cursor), dtype=np.int64))
+        return keys
+
+    def validate_chunk(
+        self,
+        table_name: str,
+        df: pd.DataFrame,
+        column_types: Dict[str, str],
+        reference_keys: Dict[str, Any],
+        errors: List[Dict[str, Any]],
+    ) -> pd.DataFrame:
+        """Drop rows with bad types, non-canonical dates or dangling foreign keys.
+
+        Whole columns are checked at once (to_numeric / to_datetime / searchsorted against
+        the sorted key arrays), never row by row. Up to MAX_IMPORT_ERRORS rejected cells are appended to ``errors``; the first
+        failing column of each row is the one reported.
+        """
+        bad = pd.Series(False, index=df.index)
+        first_error = len(errors)
+
+        def reject(mask: pd.Series, column: str, reason: str) -> None:
+            mask = mask & ~bad
+            if not mask.any():
+                return
+            room = self.MAX_IMPORT_ERRORS - len(errors)
+            for index, value in df.loc[mask, column].head(max(room, 0)).items():
+                # 行号按 CSV 文件计（第 1 行为表头）
+                errors.append(
+                    {"line": int(index) + 2, "column": column, "value": None if pd.isna(value) else value, "error": reason}
+                )
+            bad.loc[mask] = True
+
+        for column in df.columns:
+            declared = column_types.get(column, "").upper()
+            raw = df[column]
+            present = raw.notna()
+            numbers = None
+            if "INT" in declared:
+                numbers = parse_numbers(raw)
+                reject(present & (numbers.isna() | (numbers % 1 != 0)), column, "不是整数")
+            elif declared in ("REAL", "FLOAT", "DOUBLE", "NUMERIC"):
+                numbers = parse_numbers(raw)
+                reject(present & numbers.isna(), column, "不是数字")
+            elif "DATE" in declared or "TIME" in declared:
+                text = raw.str.strip()
+                canonical = text.str.fullmatch(self.DATE_TEXT_RE, na=False)
+                # the regex fixes the shape, strptime rejects impossible values such as 02-30 or 25:00
+                full = text.where(text.str.len() == 19, text + " 00:00:00").where(canonical)
+                parsed = pd.to_datetime(full, errors="coerce", format="%Y-%m-%d %H:%M:%S")
+                reject(present & parsed.isna(), column, "日期应为 YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD")
+                df[column] = text
+            if column in reference_keys:
+                # only values given are checked: a missing column or an empty cell stays NULL
+                ref_table = self.FOREIGN_KEYS[table_name][column][0]
+                keys = reference_keys[column]
+                values = numbers.to_numpy(dtype=np.float64)
+                if len(keys) == 0:
+                    found = np.zeros(len(values), dtype=bool)  # empty referenced table: nothing can match
+                else:
+                    found = keys[np.clip(np.searchsorted(keys, values), 0, len(keys) - 1)] == values
+                reject(present & pd.Series(~found, index=df.index), column, f"在 {ref_table} 中不存在")
+        errors[first_error:] = sorted(errors[first_error:], key=lambda item: item["line"])
+        return df[~bad]
+
+    def refresh_after_import(self, conn: sqlite3.Connection, touched_days: set, summary_stale: bool) -> str | None:
+        """Refresh the rollup for ``touched_days`` (and every item summary when stale) and commit.
+
+        The imported rows are already committed, so a failure here must not be reported as
+        a failed import: it is rolled back and returned as a message instead.
+        """
+        try:
+            self.refresh_rollup(conn, touched_days)
+            if summary_stale:
+                # 商品改了品类：所有订单的 categories 都可能变化
+                self.refresh_item_summary(conn)
+            conn.commit()
+        except sqlite3.Error as exc:
+            conn.rollback()
+            return f"汇总表刷新失败（{exc}），请运行 --rebuild-rollup 重建"
+        return None
+
+    def import_csv_stream(
+        self,
+        table_name: str,
+        text_stream: Any,
+        chunk_size: int = 10000,
+        progress: Callable[[Dict[str, Any]], None] | None = None,
+        mode: str = "append",
+    ) -> Dict[str, Any]:
+        """Write CSV rows from a text stream to a whitelisted table, ``chunk_size`` rows at a time.
 
-    def import_csv_data(self, table_name: str, csv_content: str, row_limit: int = 5000) -> Dict[str, Any]:
-        """Import CSV to a whitelisted table with basic validation."""
+        ``mode``: ``append`` (a duplicate key fails the chunk), ``upsert`` (update rows whose
+        values changed) or ``skip_existing`` (keep the stored row). Rows failing
+        validate_chunk are left out and listed in ``rejected_rows``. Each chunk is parsed by
+        pandas, written with ``executemany`` and committed on its own, so memory stays flat
+        for uploads of any size. A failing chunk is rolled back; earlier chunks stay
+        committed and are reported in ``rows``. The daily rollup is refreshed once for all
+        touched days after the last chunk.
+        """
         if table_name not in self.allowed_tables:
             return {"success": False, "error": "不支持的表名"}
+        if mode not in self.IMPORT_MODES:
+            return {"success": False, "error": f"mode 仅支持 {' / '.join(self.IMPORT_MODES)}"}
 
         try:
-            df = pd.read_csv(io.StringIO(csv_content))
-            # 清理列名首尾空格，避免因 CSV 空格导致匹配失败
-            df.columns = df.columns.astype(str).str.strip()
+            # dtype=str: leave type conversion to SQLite column affinity
+            reader = pd.read_csv(text_stream, chunksize=chunk_size, dtype=str)
+        except pd.errors.EmptyDataError:
+            return {"success": False, "error": "CSV 为空"}
         except Exception as exc:  # pragma: no cover - defensive
             return {"success": False, "error": f"CSV 解析失败: {exc}"}
 
-        if len(df) == 0:
+        started = time.perf_counter()
+        column_types = {c["name"]: c["type"] for c in self.get_table_info(table_name)}
+        table_columns = list(column_types)
+        pk = self.primary_key(table_name)
+        total = 0
+        counts = {"inserted": 0, "updated": 0, "skipped": 0, "rejected": 0}
+        rejected_rows: List[Dict[str, Any]] = []
+        reference_keys: Dict[str, Any] = {}
+        chunks: List[Dict[str, Any]] = []
+        insert_sql = None
+        touched_days: set = set()
+        summary_stale = False
+        parsed = 0
+        with self.pool.connection() as conn:
+            try:
+                for index, df in enumerate(reader):
+                    chunk_started = time.perf_counter()
+                    # 清理列名首尾空格，避免因 CSV 空格导致匹配失败
+                    df.columns = df.columns.astype(str).str.strip()
+                    if insert_sql is None:
+                        unknown_columns = [col for col in df.columns if col not in table_columns]
+                        if unknown_columns:
+                            return {
+                                "success": False,
+                                "error": f"包含未知列: {', '.join(unknown_columns)}；期望列: {', '.join(table_columns)}",
+                            }
+                        # Ensure required PK exists if the CSV does not provide one (sqlite would auto-create ROWID otherwise)
+                        if table_name == "users" and "user_id" not in df.columns:
+                            return {"success": False, "error": "缺少用户主键 user_id"}
+                        if mode != "append" and pk not in df.columns:
+                            return {"success": False, "error": f"{mode} 模式需要主键列 {pk}"}
+                        reference_keys = self.load_reference_keys(conn, table_name, list(df.columns))
+                        insert_sql = self.build_import_sql(table_name, list(df.columns), mode, pk)
+
+                    if df.empty:
+                        continue
+                    parsed += len(df)
+                    chunk_rows = len(df)
+                    df = self.validate_chunk(table_name, df, column_types, reference_keys, rejected_rows)
+                    rejected = chunk_rows - len(df)
+                    values = df.to_numpy(dtype=object, copy=True)
+                    values[pd.isna(values)] = None
+
+                    existing = 0
+                    touched_orders: set = set()
+                    # key columns as validated integers: CSV text like "900002.0" must not be re-parsed with int()
+                    pk_values = parse_numbers(df[pk]).dropna().astype("int64") if pk in df.columns else None
+                    if mode == "upsert":
+                        # 先查出已存在的主键，并带出旧的归属：orders 改日期时两天的日汇总都要重算，
+                        # order_items 换订单时新旧两个订单的明细汇总都要重算
+                        owner_column = {"orders": ", substr(order_date, 1, 10)", "order_items": ", order_id"}.get(
+                            table_name, ""
+                        )
+                        rows = conn.execute(
+                            f"SELECT {pk}{owner_column} FROM {table_name} "
+                            f"WHERE {pk} IN (SELECT value FROM json_each(?))",
+                            (json.dumps(pk_values.tolist()),),
+                        ).fetchall()
+                        existing = len(rows)
+                        owners = {row[1] for row in rows if row[1] is not None} if owner_column else set()
+                        if table_name == "orders":
+                            touched_days.update(owners)
+                        elif table_name == "order_items":
+                            touched_orders.update(owners)
+
+                    changes_before = conn.total_changes
+                    conn.executemany(insert_sql, values.tolist())
+                    changed = conn.total_changes - changes_before
+                    if mode == "upsert":
+                        # 同一块内重复的新主键只算一次新增，其余按是否改动计为更新/跳过
+                        inserted = pk_values.nunique() - existing + int(df[pk].isna().sum())
+                        chunk_counts = {"inserted": inserted, "updated": changed - inserted}
+                    else:
+                        chunk_counts = {"inserted": changed, "updated": 0}
+                    chunk_counts["skipped"] = len(df) - chunk_counts["inserted"] - chunk_counts["updated"]
+                    chunk_counts["rejected"] = rejected
+                    if table_name == "orders" and "order_date" in df.columns:
+                        touched_days.update(df["order_date"].dropna().str[:10].unique())
+                    if table_name == "order_items" and chunk_counts["inserted"] + chunk_counts["updated"]:
+                        touched_orders.update(parse_numbers(df["order_id"]).dropna().astype("int64").tolist())
+                        self.refresh_item_summary(conn, touched_orders)
+                    if table_name == "products" and "category" in df.columns and chunk_counts["updated"]:
+                        summary_stale = True
+                    conn.commit()
+
+                    total += len(df)
+                    for key, value in chunk_counts.items():
+                        counts[key] += value
+                    chunk_info = {
+                        "chunk": index + 1,
+                        "rows": len(df),
+                        **chunk_counts,
+                        "total_rows": total,
+                        "rows_parsed": parsed,
+                        "seconds": round(time.perf_counter() - chunk_started, 4),
+                    }
+                    chunks.append(chunk_info)
+                    if progress is not None:
+                        progress(chunk_info)
+            except Exception as exc:
+                conn.rollback()
+                refresh_error = None
+                if total:
+                    refresh_error = self.refresh_after_import(conn, touched_days, summary_stale)
+                    self.data_changed()
+                return {
+                    "success": False,
+                    "error": f"导入失败: {exc}" + (f"；{refresh_error}" if refresh_error else ""),
+                    "rows": total,
+                    "rows_parsed": parsed,
+                    **counts,
+                    "rejected_rows": rejected_rows,
+                    "chunks": chunks,
+                }
+            # 汇总表在全部块写入后按受影响日期一次性重算，避免每块重复聚合同一天
+            refresh_error = self.refresh_after_import(conn, touched_days, summary_stale)
+
+        if total == 0 and counts["rejected"]:
+            return {
+                "success": False,
+                "error": f"全部 {counts['rejected']} 行未通过校验",
+                "rows_parsed": parsed,
+                **counts,
+                "rejected_rows": rejected_rows,
+            }
+        if total == 0:
             return {"success": False, "error": "CSV 为空"}
-        if len(df) > row_limit:
-            return {"success": False, "error": f"单次导入最多 {row_limit} 行"}
+        if counts["inserted"] or counts["updated"]:
+            self.data_changed()
+        elapsed = time.perf_counter() - started
+        if mode == "append":
+            message = f"成功追加 {total} 行数据到 {table_name}"
+        else:
+            message = (
+                f"成功导入 {total} 行到 {table_name}：新增 {counts['inserted']}，"
+                f"更新 {counts['updated']}，跳过 {counts['skipped']}"
+            )
+        if counts["rejected"]:
+            message += f"；{counts['rejected']} 行未通过校验，见 rejected_rows"
+        if refresh_error:
+            message += f"；{refresh_error}"
+        return {
+            "success": True,
+            "message": message,
+            "refresh_error": refresh_error,
+            "mode": mode,
+            "rows": total,
+            "rows_parsed": parsed,
+            **counts,
+            "rejected_rows": rejected_rows,
+            "chunks": chunks,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(total / elapsed) if elapsed else total,
+        }
 
-        columns = [c["name"] for c in self.get_table_info(table_name)]
-        unknown_columns = [col for col in df.columns if col not in columns]
-        if unknown_columns:
-            return {"success": False, "error": f"包含未知列: {', '.join(unknown_columns)}；期望列: {', '.join(columns)}"}
 
-        # Ensure required PK exists if the CSV does not provide one (sqlite would auto-create ROWID otherwise)
-        if "user_id" in columns and "user_id" not in df.columns and table_name == "users":
-            return {"success": False, "error": "缺少用户主键 user_id"}
+class RequestBodyReader(io.RawIOBase):
+    """Raw reader over exactly ``Content-Length`` bytes of a request body."""
 
-        conn = self.get_connection()
-        try:
-            # 采用追加模式，不再清空原有数据（避免覆盖原订单）
-            df.to_sql(table_name, conn, if_exists="append", index=False)
-            conn.commit()
-            return {"success": True, "message": f"成功追加 {len(df)} 行数据到 {table_name}"}
-        except Exception as exc:  # pragma: no cover - defensive
-            conn.rollback()
-            return {"success": False, "error": f"导入失败: {exc}"}
-        finally:
-            conn.close()
+    def __init__(self, raw: Any, length: int) -> None:
+        self._raw = raw
+        self.remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.remaining <= 0:
+            return 0
+        view = memoryview(buffer)[: min(len(buffer), self.remaining)]
+        n = self._raw.readinto(view)
+        if not n:
+            raise ValueError("请求体不完整")
+        self.remaining -= n
+        return n
+
+
+class MultipartFileReader(io.RawIOBase):
+    """Raw reader over the first file part of a multipart/form-data body.
+
+    Plain form fields that come before the file are collected in ``fields``; the file
+    content is then streamed up to the next boundary without buffering the upload.
+    """
+
+    def __init__(self, raw: Any, boundary: str) -> None:
+        self._raw = raw
+        self._delimiter = b"\r\n--" + boundary.encode("latin-1")
+        # the first boundary has no leading CRLF; pretend it does
+        self._buffer = bytearray(b"\r\n")
+        self._done = False
+        self.fields: Dict[str, str] = {}
+        self.filename: str | None = None
+        self._read_until_delimiter()  # preamble
+        self._open_file_part()
+
+    def readable(self) -> bool:
+        return True
+
+    def _read_more(self) -> None:
+        chunk = self._raw.read(65536)
+        if not chunk:
+            raise ValueError("multipart 数据不完整")
+        self._buffer += chunk
+
+    def _read_line(self) -> bytes:
+        while b"\r\n" not in self._buffer:
+            self._read_more()
+        index = self._buffer.index(b"\r\n")
+        line = bytes(self._buffer[:index])
+        del self._buffer[: index + 2]
+        return line
+
+    def _read_until_delimiter(self) -> bytes:
+        while self._delimiter not in self._buffer:
+            self._read_more()
+        index = self._buffer.index(self._delimiter)
+        value = bytes(self._buffer[:index])
+        del self._buffer[: index + len(self._delimiter)]
+        return value
+
+    def _open_file_part(self) -> None:
+        while True:
+            if self._read_line().startswith(b"--"):
+                raise ValueError("未找到上传的 CSV 文件")
+            headers = {}
+            while True:
+                line = self._read_line()
+                if not line:
+                    break
+                name, _, value = line.decode("utf-8", "replace").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            disposition = headers.get("content-disposition", "")
+            params = dict(re.findall(r'(\w+)="([^"]*)"', disposition))
+            if "filename" in params:
+                self.filename = params["filename"]
+                return
+            self.fields[params.get("name", "")] = self._read_until_delimiter().decode("utf-8")
+
+    def readinto(self, buffer) -> int:
+        while not self._done:
+            index = self._buffer.find(self._delimiter)
+            available = index if index != -1 else len(self._buffer) - len(self._delimiter)
+            if available > 0:
+                n = min(len(buffer), available)
+                buffer[:n] = self._buffer[:n]
+                del self._buffer[:n]
+                return n
+            if index == 0:
+                self._done = True
+                break
+            self._read_more()
+        return 0
 
 
 class DataAnalyzer:
-    def __init__(self, db_path: str = "ecommerce.db") -> None:
-        self.db = DatabaseManager(db_path)
+    # cache lifetime for drill-downs of days before today (imports still invalidate them)
+    HISTORICAL_DAY_TTL = 24 * 3600.0
+    # orders per page of /api/orders/day/ unless ?limit= says otherwise, and in a drill-down
+    DAY_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 500
+    # SQL sent in a POST body (the URL form stays capped at 2000 characters)
+    MAX_POST_SQL_LENGTH = 100_000
 
+    def __init__(
+        self,
+        db_path: str = "ecommerce.db",
+        cache: ResultCache | None = None,
+        query_guard: QueryGuard | None = None,
+        query_cache: QueryCache | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
+        self.cache = cache
+        self.metrics = metrics
+        self.db = DatabaseManager(db_path, cache=cache, metrics=metrics)
+        self.query_guard = query_guard or QueryGuard()
+        self.query_cache = query_cache or QueryCache()
+
+    @cached_result
     def get_dashboard_overview(self) -> Dict[str, Any]:
         try:
             tables = self.db.get_all_tables()
-            orders_count = self.db.get_table_row_count("orders") if "orders" in tables else 0
-            use_douyin = "douyin_sales" in tables and orders_count == 0
+            has_orders = "orders" in tables and self.db.table_has_rows("orders")
+            use_douyin = "douyin_sales" in tables and not has_orders
             if use_douyin:
                 today_sql = """
                 SELECT 
@@ -242,21 +2547,23 @@ class DataAnalyzer:
             else:
                 today_sql = """
                 SELECT 
-                    COUNT(*) as today_orders,
-                    COALESCE(SUM(total_amount), 0) as today_sales,
-                    COUNT(DISTINCT user_id) as today_customers,
-                    COALESCE(AVG(total_amount), 0) as today_avg_order_value
-                FROM orders 
-                WHERE DATE(order_date) = DATE('now','localtime')
+                    COALESCE(SUM(order_count), 0) as today_orders,
+                    COALESCE(SUM(sales_total), 0) as today_sales,
+                    (SELECT COUNT(*) FROM daily_order_customers
+                     WHERE day = DATE('now','localtime') AND cancelled = 0) as today_customers,
+                    COALESCE(SUM(sales_total) / SUM(order_count), 0) as today_avg_order_value
+                FROM daily_order_rollup
+                WHERE day = DATE('now','localtime')
                   AND status != 'cancelled'
                 """
                 monthly_sql = """
                 SELECT 
-                    COUNT(*) as monthly_orders,
-                    COALESCE(SUM(total_amount), 0) as monthly_sales,
-                    COUNT(DISTINCT user_id) as monthly_customers
-                FROM orders
-                WHERE order_date >= DATE('now', '-30 days','localtime')
+                    COALESCE(SUM(order_count), 0) as monthly_orders,
+                    COALESCE(SUM(sales_total), 0) as monthly_sales,
+                    (SELECT COUNT(DISTINCT user_id) FROM daily_order_customers
+                     WHERE day >= DATE('now', '-30 days','localtime') AND cancelled = 0) as monthly_customers
+                FROM daily_order_rollup
+                WHERE day >= DATE('now', '-30 days','localtime')
                   AND status != 'cancelled'
                 """
 
@@ -267,26 +2574,29 @@ class DataAnalyzer:
                 "monthly_metrics": monthly_data[0] if monthly_data else {},
             }
         except Exception:
-            # Return fallback numbers to keep UI alive
-            return {
-                "today_metrics": {
-                    "today_orders": 18,
-                    "today_sales": 12560.50,
-                    "today_customers": 15,
-                    "today_avg_order_value": 697.81,
-                },
-                "monthly_metrics": {
-                    "monthly_orders": 245,
-                    "monthly_sales": 187920.75,
-                    "monthly_customers": 189,
-                },
-            }
+            # Return fallback numbers to keep UI alive; never cache them
+            return Uncached(
+                {
+                    "today_metrics": {
+                        "today_orders": 18,
+                        "today_sales": 12560.50,
+                        "today_customers": 15,
+                        "today_avg_order_value": 697.81,
+                    },
+                    "monthly_metrics": {
+                        "monthly_orders": 245,
+                        "monthly_sales": 187920.75,
+                        "monthly_customers": 189,
+                    },
+                }
+            )
 
+    @cached_result
     def get_sales_trend(self, days: int = 30) -> List[Dict[str, Any]]:
         try:
             tables = self.db.get_all_tables()
-            orders_count = self.db.get_table_row_count("orders") if "orders" in tables else 0
-            if "douyin_sales" in tables and orders_count == 0:
+            has_orders = "orders" in tables and self.db.table_has_rows("orders")
+            if "douyin_sales" in tables and not has_orders:
                 sql = f"""
                 SELECT 
                     DATE(date,'localtime') as date,
@@ -301,20 +2611,20 @@ class DataAnalyzer:
             else:
                 sql = f"""
                 SELECT 
-                    DATE(order_date,'localtime') as date,
-                    COUNT(*) as order_count,
-                    COALESCE(SUM(total_amount), 0) as daily_sales,
-                    COALESCE(AVG(total_amount), 0) as avg_order_value
-                FROM orders 
-                WHERE order_date >= DATE('now', '-{days} days','localtime')
+                    day as date,
+                    SUM(order_count) as order_count,
+                    COALESCE(SUM(sales_total), 0) as daily_sales,
+                    COALESCE(SUM(sales_total) / SUM(order_count), 0) as avg_order_value
+                FROM daily_order_rollup
+                WHERE day >= DATE('now', '-{days} days','localtime')
                   AND status != 'cancelled'
-                GROUP BY DATE(order_date,'localtime')
-                ORDER BY date
+                GROUP BY day
+                ORDER BY day
                 """
             result = self.db.execute_query(sql)
             return result or self.generate_sample_sales_data(days)
         except Exception:
-            return self.generate_sample_sales_data(days)
+            return Uncached(self.generate_sample_sales_data(days))
 
     def generate_sample_sales_data(self, days: int) -> List[Dict[str, Any]]:
         data = []
@@ -333,6 +2643,7 @@ class DataAnalyzer:
             )
         return data
 
+    @cached_result
     def get_category_analysis(self) -> List[Dict[str, Any]]:
         try:
             sql = """
@@ -351,7 +2662,7 @@ class DataAnalyzer:
             result = self.db.execute_query(sql)
             return result or self.generate_sample_category_data()
         except Exception:
-            return self.generate_sample_category_data()
+            return Uncached(self.generate_sample_category_data())
 
     def generate_sample_category_data(self) -> List[Dict[str, Any]]:
         categories = ["电子产品", "服装", "家居", "美妆", "食品"]
@@ -367,36 +2678,79 @@ class DataAnalyzer:
             )
         return data
 
-    def get_custom_query(self, sql_query: str, row_limit: int = 500) -> Dict[str, Any] | List[Dict[str, Any]]:
-        """Guardrail: only allow SELECT/WITH queries and cap result size."""
+    def validate_custom_query(self, sql_query: str, row_limit: int | None = 500, max_length: int = 2000) -> tuple:
+        """Guardrail: only allow SELECT/WITH queries and cap result size; ``(query, error)``.
+
+        ``row_limit=None`` leaves the query unlimited (server-side cursors page through it).
+        """
         clean_query = sql_query.strip().rstrip(";")
         if not clean_query:
-            return {"error": "SQL 不能为空"}
-        if len(clean_query) > 2000:
-            return {"error": "SQL 过长，请精简后再试"}
+            return None, "SQL 不能为空"
+        if len(clean_query) > max_length:
+            return None, "SQL 过长，请精简后再试"
         if ";" in clean_query:
-            return {"error": "不支持多条语句"}
+            return None, "不支持多条语句"
         if re.search(r"\b(insert|update|delete|drop|alter|truncate|create|attach|pragma)\b", clean_query, re.I):
-            return {"error": "出于安全考虑，仅支持查询语句(SELECT/WITH)"}
+            return None, "出于安全考虑，仅支持查询语句(SELECT/WITH)"
         if not re.match(r"^(select|with)\b", clean_query, re.I):
-            return {"error": "仅允许 SELECT/WITH 查询"}
+            return None, "仅允许 SELECT/WITH 查询"
         if " order_items " in clean_query.lower() and "join" not in clean_query.lower():
             # gentle reminder when querying detail table alone
             pass
-        if re.search(r"\blimit\b", clean_query, re.I) is None:
+        if row_limit is not None and re.search(r"\blimit\b", clean_query, re.I) is None:
             clean_query = f"{clean_query} LIMIT {row_limit}"
+        return clean_query, None
+
+    def get_custom_query(
+        self, sql_query: str, row_limit: int = 500, stream: bool = False
+    ) -> Dict[str, Any] | List[Dict[str, Any]] | QueryStream:
+        """Run an ad-hoc SELECT/WITH through the query cache and the query guard.
+
+        A repeated SQL text skips validation; its result set is replayed from the cache
+        while no import has changed the data since it was read.
+        """
+        started = time.perf_counter()
+        key = (sql_query.strip(), row_limit)
+        entry = self.query_cache.statement(key)
+        if entry is None:
+            entry = self.query_cache.add_statement(key, *self.validate_custom_query(sql_query, row_limit))
+        if entry["error"]:
+            return {"error": entry["error"]}
+        fingerprint = entry["fingerprint"]
+        generation = self.cache.generation if self.cache is not None else None
+
+        cached = self.query_cache.result(entry, generation) if generation is not None else None
+        if cached is not None:
+            columns, rows = cached
+            self.query_cache.record(fingerprint, time.perf_counter() - started, len(rows), cached=True)
+            if stream:
+                return CachedQueryStream(columns, rows)
+            return [dict(zip(columns, row)) for row in rows]
+
+        def completed(done: QueryStream) -> None:
+            # time until the last row was read, i.e. including the response write when streaming
+            self.query_cache.record(fingerprint, time.perf_counter() - started, done.row_count)
+            if generation is not None and done.kept is not None:
+                self.query_cache.store_result(entry, generation, done.columns, done.kept)
+
         try:
-            return self.db.execute_query(clean_query)
+            rows = self.db.stream_query(
+                entry["query"], guard=self.query_guard, keep_rows=self.query_cache.max_rows, on_complete=completed
+            )
+            if stream:
+                return rows
+            return [dict(zip(rows.columns, row)) for row in rows]
         except Exception as exc:
+            self.query_cache.record(fingerprint, time.perf_counter() - started, error=True)
             return {"error": str(exc)}
 
+    @cached_result
     def get_database_info(self) -> Dict[str, Any]:
-        tables = self.db.get_all_tables()
         table_info: Dict[str, Any] = {}
-        for table in tables:
+        for table, columns in self.db.schema_tables().items():
             table_info[table] = {
                 "row_count": self.db.get_table_row_count(table),
-                "columns": self.db.get_table_info(table),
+                "columns": [dict(column) for column in columns],
             }
         return table_info
 
@@ -411,25 +2765,25 @@ class DataAnalyzer:
                 ORDER BY date
                 """
                 return self.db.execute_query(sql)
-            # fallback: aggregate orders table
+            # fallback: daily rollup of the orders table
             sql = """
             SELECT 
-                DATE(order_date) as date,
-                SUM(total_amount) as gmv,
-                COUNT(*) as order_count,
-                COUNT(DISTINCT user_id) as paying_users,
+                r.day as date,
+                SUM(r.sales_total) as gmv,
+                SUM(r.order_count) as order_count,
+                (SELECT COUNT(DISTINCT c.user_id) FROM daily_order_customers c WHERE c.day = r.day) as paying_users,
                 0 as refund_rate,
-                COALESCE(AVG(total_amount),0) as aov
-            FROM orders
-            GROUP BY DATE(order_date)
-            ORDER BY date
+                COALESCE(SUM(r.sales_total) / SUM(r.order_count),0) as aov
+            FROM daily_order_rollup r
+            GROUP BY r.day
+            ORDER BY r.day
             """
             return self.db.execute_query(sql)
         except Exception:
             return []
 
-    def get_day_orders(self, day: str) -> List[Dict[str, Any]]:
-        """Return order-level detail for a given date (from orders/order_items)."""
+    def get_day_orders(self, day: str, stream: bool = False) -> List[Dict[str, Any]] | QueryStream:
+        """Return order-level detail for a given date (orders + order_item_summary)."""
         try:
             sql = """
             SELECT 
@@ -439,28 +2793,169 @@ class DataAnalyzer:
                 o.total_amount,
                 o.status,
                 o.payment_method,
-                COUNT(oi.item_id) as item_count,
-                GROUP_CONCAT(DISTINCT p.category) as categories
+                IFNULL(s.item_count, 0) as item_count,
+                s.categories
             FROM orders o
-            LEFT JOIN order_items oi ON o.order_id = oi.order_id
-            LEFT JOIN products p ON oi.product_id = p.product_id
-            WHERE datetime(o.order_date) >= datetime(?, 'start of day')
-              AND datetime(o.order_date) <  datetime(?, 'start of day', '+1 day')
-            GROUP BY o.order_id
+            LEFT JOIN order_item_summary s ON o.order_id = s.order_id
+            WHERE o.order_date >= ? AND o.order_date < ?
             ORDER BY o.order_date
             """
-            return self.db.execute_query(sql, (day, day))
+            if stream:
+                return self.db.stream_query(sql, day_bounds(day))
+            return self.db.execute_query(sql, day_bounds(day))
         except Exception:
             return []
 
-    def get_order_day(self, day: str) -> List[Dict[str, Any]]:
-        """Alias for day-level detail from orders (non-douyin)."""
-        return self.get_day_orders(day)
+    def get_day_orders_page(
+        self,
+        day: str,
+        limit: int = DAY_PAGE_SIZE,
+        cursor: str | None = None,
+        status: str | None = None,
+        payment_method: str | None = None,
+        descending: bool = False,
+    ) -> Dict[str, Any]:
+        """One page of a day's orders, keyset-paginated on ``(order_date, order_id)``.
+
+        Each page is a range scan on idx_orders_order_date that starts right after the
+        cursor, so its cost depends on ``limit`` rather than on how busy the day was.
+        """
+        try:
+            bounds = day_bounds(day)
+        except ValueError:
+            return {"error": "日期格式应为 YYYY-MM-DD"}
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as exc:
+            return {"error": str(exc)}
+        limit = min(max(limit, 1), self.MAX_PAGE_SIZE)
+
+        conditions = ["o.order_date >= ?", "o.order_date < ?"]
+        params: List[Any] = list(bounds)
+        if after is not None:
+            # the token is client-supplied: only (order_date, order_id) may reach the binding
+            if not (
+                len(after) == 2
+                and isinstance(after[0], str)
+                and isinstance(after[1], int)
+                and not isinstance(after[1], bool)
+            ):
+                return {"error": "cursor 无效"}
+            conditions.append(f"(o.order_date, o.order_id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+        if status:
+            conditions.append("o.status = ?")
+            params.append(status)
+        if payment_method:
+            conditions.append("o.payment_method = ?")
+            params.append(payment_method)
+        direction = "DESC" if descending else "ASC"
+        try:
+            rows = self.db.execute_query(
+                f"""
+                SELECT
+                    o.order_id,
+                    o.user_id,
+                    o.order_date,
+                    o.total_amount,
+                    o.status,
+                    o.payment_method,
+                    IFNULL(s.item_count, 0) as item_count,
+                    s.categories
+                FROM orders o
+                LEFT JOIN order_item_summary s ON o.order_id = s.order_id
+                WHERE {" AND ".join(conditions)}
+                ORDER BY o.order_date {direction}, o.order_id {direction}
+                LIMIT ?
+                """,
+                (*params, limit + 1),
+            )
+        except Exception as exc:
+            return {"error": f"查询失败: {exc}"}
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["order_date"], rows[-1]["order_id"])
+        return {"day": bounds[0], "limit": limit, "orders": rows, "next_cursor": next_cursor}
+
+    def get_day_drilldown(self, day: str) -> Dict[str, Any]:
+        """First page of a day's orders and its category / hour / payment charts in one response.
+
+        The charts cover the whole day; further orders are read with ``next_cursor`` from
+        /api/orders/day/. Past days only change through imports (which bump the cache
+        generation), so they are cached for HISTORICAL_DAY_TTL; today falls back to the
+        normal TTL. Errors are not cached.
+        """
+        try:
+            start, _ = day_bounds(day)
+        except ValueError:
+            return {"error": "日期格式应为 YYYY-MM-DD"}
+        if self.cache is None:
+            result = self._compute_day_drilldown(start)
+            return result.value if isinstance(result, Uncached) else result
+        ttl = self.HISTORICAL_DAY_TTL if start < datetime.now().strftime("%Y-%m-%d") else None
+        return self.cache.get_or_compute(("get_day_drilldown", start), lambda: self._compute_day_drilldown(start), ttl)
+
+    def _compute_day_drilldown(self, day: str) -> Dict[str, Any] | Uncached:
+        # one page of orders; the day's orders are scanned once, grouped by (hour, payment
+        # method) and folded into both charts; the items are read once, grouped by category
+        page = self.get_day_orders_page(day, self.DAY_PAGE_SIZE)
+        if "error" in page:
+            return Uncached(page)
+        bounds = day_bounds(day)
+        try:
+            slots = self.db.execute_query(
+                """
+                SELECT strftime('%H', order_date, 'localtime') AS hour,
+                       payment_method,
+                       COUNT(*) AS orders,
+                       SUM(total_amount) AS sales
+                FROM orders
+                WHERE order_date >= ? AND order_date < ?
+                GROUP BY 1, 2
+                """,
+                bounds,
+            )
+            category = self.db.execute_query(
+                """
+                SELECT p.category,
+                       SUM(oi.quantity * oi.unit_price) AS revenue,
+                       SUM(oi.quantity) AS qty
+                FROM orders o
+                JOIN order_items oi ON oi.order_id = o.order_id
+                JOIN products p ON oi.product_id = p.product_id
+                WHERE o.order_date >= ? AND o.order_date < ?
+                GROUP BY p.category
+                ORDER BY revenue DESC
+                """,
+                bounds,
+            )
+        except Exception as exc:
+            return Uncached({"error": f"查询失败: {exc}"})
+        hours: Dict[Any, Dict[str, Any]] = {}
+        payments: Dict[Any, Dict[str, Any]] = {}
+        for row in slots:
+            for groups, key, name in ((hours, row["hour"], "hour"), (payments, row["payment_method"], "payment_method")):
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = {name: key, "orders": 0, "sales": None}
+                group["orders"] += row["orders"]
+                if row["sales"] is not None:
+                    group["sales"] = (group["sales"] or 0) + row["sales"]
+        return {
+            "day": day,
+            "orders": page["orders"],
+            "next_cursor": page["next_cursor"],
+            "category": category,
+            "hour": sorted(hours.values(), key=lambda g: g["hour"] or ""),
+            "payment": sorted(payments.values(), key=lambda g: g["orders"], reverse=True),
+        }
 
     def get_order_day_stats(self, day: str) -> Dict[str, Any]:
         """Aggregated stats for a given day: category revenue/qty, hourly orders/sales, payment split."""
         stats = {"category": [], "hour": [], "payment": []}
         try:
+            bounds = day_bounds(day)
             cat_sql = """
             SELECT p.category,
                    SUM(oi.quantity * oi.unit_price) AS revenue,
@@ -468,92 +2963,264 @@ class DataAnalyzer:
             FROM order_items oi
             JOIN orders o ON oi.order_id = o.order_id
             JOIN products p ON oi.product_id = p.product_id
-            WHERE datetime(o.order_date) >= datetime(?, 'start of day')
-              AND datetime(o.order_date) <  datetime(?, 'start of day', '+1 day')
+            WHERE o.order_date >= ? AND o.order_date < ?
             GROUP BY p.category
             ORDER BY revenue DESC
             """
-            stats["category"] = self.db.execute_query(cat_sql, (day, day))
+            stats["category"] = self.db.execute_query(cat_sql, bounds)
 
             hour_sql = """
             SELECT strftime('%H', o.order_date,'localtime') AS hour,
                    COUNT(*) AS orders,
                    SUM(o.total_amount) AS sales
             FROM orders o
-            WHERE datetime(o.order_date) >= datetime(?, 'start of day')
-              AND datetime(o.order_date) <  datetime(?, 'start of day', '+1 day')
+            WHERE o.order_date >= ? AND o.order_date < ?
             GROUP BY strftime('%H', o.order_date,'localtime')
             ORDER BY hour
             """
-            stats["hour"] = self.db.execute_query(hour_sql, (day, day))
+            stats["hour"] = self.db.execute_query(hour_sql, bounds)
 
             pay_sql = """
             SELECT payment_method,
                    COUNT(*) AS orders,
                    SUM(total_amount) AS sales
             FROM orders
-            WHERE datetime(order_date) >= datetime(?, 'start of day')
-              AND datetime(order_date) <  datetime(?, 'start of day', '+1 day')
+            WHERE order_date >= ? AND order_date < ?
             GROUP BY payment_method
             ORDER BY orders DESC
             """
-            stats["payment"] = self.db.execute_query(pay_sql, (day, day))
+            stats["payment"] = self.db.execute_query(pay_sql, bounds)
         except Exception:
             return stats
         return stats
 
-    def import_data(self, table_name: str, csv_content: str) -> Dict[str, Any]:
-        return self.db.import_csv_data(table_name, csv_content)
+    @cached_result
+    def get_order_total_mismatches(self, tolerance: float = 0.01, limit: int = 100) -> Dict[str, Any]:
+        """Orders whose total_amount differs from the sum of their items by more than ``tolerance``.
+
+        Orders without any items are included with item_revenue 0.
+        """
+        condition = "ABS(o.total_amount - IFNULL(s.item_revenue, 0)) > ?"
+        summary = self.db.execute_query(
+            f"""
+            SELECT COUNT(*) AS checked, COALESCE(SUM({condition}), 0) AS mismatched
+            FROM orders o
+            LEFT JOIN order_item_summary s ON o.order_id = s.order_id
+            """,
+            (tolerance,),
+        )[0]
+        orders = self.db.execute_query(
+            f"""
+            SELECT o.order_id, o.order_date, o.status, o.total_amount,
+                   IFNULL(s.item_count, 0) AS item_count,
+                   IFNULL(s.item_revenue, 0) AS item_revenue,
+                   ROUND(o.total_amount - IFNULL(s.item_revenue, 0), 2) AS difference
+            FROM orders o
+            LEFT JOIN order_item_summary s ON o.order_id = s.order_id
+            WHERE {condition}
+            ORDER BY ABS(o.total_amount - IFNULL(s.item_revenue, 0)) DESC
+            LIMIT ?
+            """,
+            (tolerance, limit),
+        )
+        return {"tolerance": tolerance, **summary, "orders": orders}
+
+    def import_data(self, table_name: str, csv_content: str, mode: str = "append") -> Dict[str, Any]:
+        return self.db.import_csv_data(table_name, csv_content, mode)
+
+    def import_stream(
+        self,
+        table_name: str,
+        text_stream: Any,
+        chunk_size: int = 10000,
+        progress: Callable[[Dict[str, Any]], None] | None = None,
+        mode: str = "append",
+    ) -> Dict[str, Any]:
+        return self.db.import_csv_stream(table_name, text_stream, chunk_size, progress, mode)
+
+    def get_export_stream(self, table_name: str, date_from: str | None = None, date_to: str | None = None) -> tuple:
+        return self.db.export_stream(table_name, date_from, date_to)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        return {"read": self.db.read_pool.stats(), "write": self.db.pool.stats()}
 
-    def get_sample_data(self, table_name: str, limit: int = 5) -> List[Dict[str, Any]]:
+    def get_schema_stats(self) -> Dict[str, Any]:
+        return self.db.schema.stats()
+
+    def get_query_stats(self) -> Dict[str, Any]:
+        return {**self.query_guard.stats(), "cache": self.query_cache.stats()}
+
+    def get_top_queries(self, limit: int = 20, by: str = "count") -> List[Dict[str, Any]] | Dict[str, Any]:
+        if by not in ("count", "total_ms"):
+            return {"error": "by 仅支持 count / total_ms"}
+        return self.query_cache.top(max(1, min(limit, 100)), by)
+
+    def get_sample_data(self, table_name: str, limit: int = 5, stream: bool = False) -> List[Dict[str, Any]] | QueryStream:
         if table_name not in self.db.allowed_tables:
             return [{"error": "不支持的表"}]
+        if stream:
+            return self.db.stream_query(f"SELECT * FROM {table_name} LIMIT {limit}")
         return self.db.execute_query(f"SELECT * FROM {table_name} LIMIT {limit}")
 
 
 class EcommerceHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.analyzer = DataAnalyzer()
-        self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        # Prefer the richer dashboard page when both versions exist.
-        self.html_candidates = ("Untitled-2.html", "index.html")
-        self.rate_limit_store = {}
-        self.rate_limit_window = 60  # seconds
-        self.rate_limit_max = 120    # requests per IP per window
-        super().__init__(*args, **kwargs)
-
-    def _check_rate_limit(self):
-        """Simple per-IP rate limiter (防“侏儒攻击”/小流量猛烈重复请求)."""
-        client_ip = self.client_address[0] if self.client_address else "unknown"
-        now = time.time()
-        bucket = self.rate_limit_store.setdefault(client_ip, [])
-        # 只保留窗口内的请求
-        bucket[:] = [t for t in bucket if now - t <= self.rate_limit_window]
-        if len(bucket) >= self.rate_limit_max:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    # Prefer the richer dashboard page when both versions exist.
+    html_candidates = ("Untitled-2.html", "index.html")
+
+    @property
+    def analyzer(self) -> "DataAnalyzer":
+        """The server-wide analyzer built once at startup (see build_server)."""
+        return self.server.analyzer
+
+    def handle_one_request(self) -> None:
+        """Time each request for the metrics (route, status, serialized bytes) and finish its profile."""
+        metrics = self.server.analyzer.metrics
+        self._status = None
+        self._response_bytes = 0
+        self._profile = None
+        started = time.perf_counter()
+        failed = False
+        try:
+            super().handle_one_request()
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            # also when the handler raised: a started profile must be stopped (sampler thread, cProfile hook)
+            status = self._status if self._status is not None else (500 if failed else None)
+            method, path = self.command or "-", getattr(self, "path", "")
+            if metrics is not None and status is not None:
+                metrics.observe_request(method, path, status, time.perf_counter() - started, self._response_bytes)
+            if self._profile is not None:
+                profile, self._profile = self._profile, None
+                meta = {"method": method, "path": path, "status": status, "client": self.client_ip()}
+                try:
+                    self.server.profiler.finish(profile, meta)
+                except OSError as exc:
+                    self.log_error("写入剖析文件失败: %s", exc)
+
+    def parse_request(self) -> bool:
+        """Start a profile once the headers are known (``X-Profile`` or ``?profile=``, trusted clients only)."""
+        if not super().parse_request():
             return False
-        bucket.append(now)
+        profiler = self.server.profiler
+        if profiler is not None:
+            flag = self.headers.get("X-Profile")
+            if flag is None and "profile=" in self.path:
+                flag = self.query_params().get("profile", [""])[0]
+            mode = ProfileStore.MODES.get((flag or "").strip().lower())
+            if mode and profiler.is_trusted(self.client_ip()):
+                self._profile = profiler.start(mode)
         return True
 
+    def send_response(self, code, message=None) -> None:
+        self._status = code
+        super().send_response(code, message)
+
+    def end_headers(self) -> None:
+        if getattr(self, "_profile", None) is not None:
+            self.send_header("X-Profile-Id", self._profile["id"])
+        super().end_headers()
+
+    def count_bytes(self, size: int) -> None:
+        self._response_bytes = getattr(self, "_response_bytes", 0) + size
+
+    def client_ip(self) -> str:
+        return self.client_address[0] if self.client_address else "unknown"
+
+    def _check_rate_limit(self) -> bool:
+        """Per-IP token bucket shared by the whole server; answers 429 + Retry-After when empty."""
+        allowed, retry_after = self.server.rate_limiter.check(self.client_ip())
+        if not allowed:
+            body = json.dumps({"error": "请求过于频繁，请稍后再试"}, ensure_ascii=False).encode("utf-8")
+            self.send_response(429, "Too Many Requests")
+            self.send_header("Retry-After", str(max(1, int(retry_after + 0.999))))
+            self.send_header("Content-type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        return allowed
+
     def do_OPTIONS(self):
         """Enable CORS preflight for POST."""
         self.send_response(200)
         self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, DELETE, OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "Content-Type")
         self.end_headers()
 
     def do_POST(self):
         if not self._check_rate_limit():
-            self.send_error(429, "Too Many Requests")
             return
-        if self.path == "/api/data/import":
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/api/data/import":
             self.handle_data_import()
+        elif path == "/api/query":
+            self.handle_query_open()
         else:
             self.send_error(404, "API not found")
 
+    def do_DELETE(self):
+        if not self._check_rate_limit():
+            return
+        path = urllib.parse.urlsplit(self.path).path
+        if path.startswith("/api/cursor/"):
+            if self.server.query_cursors.discard(self.client_ip(), path.replace("/api/cursor/", "")):
+                self.send_json_response({"success": True})
+            else:
+                self.send_json_response({"error": "游标不存在或已过期"}, status=404)
+        else:
+            self.send_error(404, "API not found")
+
+    def page_size(self, default: int = 500) -> int:
+        try:
+            return int(self.query_params().get("page_size", [default])[0])
+        except ValueError:
+            return default
+
+    def handle_query_open(self) -> None:
+        """SQL tool: JSON ``{sql, page_size}``; answers the first page and a ``cursor_id`` for the rest."""
+        try:
+            content_length = int(self.headers.get("Content-Length", "0"))
+            if content_length > DataAnalyzer.MAX_POST_SQL_LENGTH * 4:  # utf-8 upper bound
+                self.send_json_response({"error": "SQL 过长，请精简后再试"}, status=413)
+                return
+            payload = json.loads(self.rfile.read(content_length).decode("utf-8") or "{}")
+            if not isinstance(payload, dict):
+                self.send_json_response({"error": "请求体必须是 JSON 对象"}, status=400)
+                return
+            sql_query = payload.get("sql")
+            if not isinstance(sql_query, str):
+                self.send_json_response({"error": "缺少 sql"}, status=400)
+                return
+            page_size = int(payload.get("page_size") or self.page_size())
+        except (ValueError, TypeError) as exc:
+            self.send_json_response({"error": f"请求体无效: {exc}"}, status=400)
+            return
+        try:
+            data = self.server.query_cursors.open(self.client_ip(), sql_query, page_size)
+        except CursorLimitError as exc:
+            self.send_json_response({"error": str(exc)}, status=429)
+            return
+        self.send_json_response(data)
+
     def handle_data_import(self) -> None:
+        """CSV import: JSON ``{table_name, csv_content}``, or a streamed ``text/csv`` /
+        ``multipart/form-data`` upload of any size with ``?table=`` (or a ``table_name``
+        form field placed before the file). ``?async=1`` queues a background job instead."""
+        content_type = self.headers.get("Content-Type", "application/json")
         try:
             content_length = int(self.headers.get("Content-Length", "0"))
+            if content_type.startswith(("text/csv", "multipart/form-data")):
+                self.handle_streaming_import(content_type, content_length)
+                return
+
             post_data = self.rfile.read(content_length)
             payload = json.loads(post_data.decode("utf-8"))
             table_name = payload.get("table_name")
@@ -563,14 +3230,67 @@ class EcommerceHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_json_response({"success": False, "error": "缺少表名或CSV数据"})
                 return
 
-            result = self.analyzer.import_data(table_name, csv_content)
+            mode = payload.get("mode") or self.import_mode()
+            if self.query_flag("async"):
+                self.submit_import_job(table_name, io.BytesIO(csv_content.encode("utf-8")), mode)
+                return
+            result = self.analyzer.import_data(table_name, csv_content, mode)
             self.send_json_response(result)
         except Exception as exc:  # pragma: no cover - defensive
             self.send_json_response({"success": False, "error": str(exc)})
 
+    def import_mode(self) -> str:
+        return self.query_params().get("mode", ["append"])[0]
+
+    def import_chunk_size(self) -> int:
+        return min(max(int(self.query_params().get("chunk_size", ["10000"])[0]), 1000), 100000)
+
+    def open_upload(self, content_type: str, content_length: int) -> tuple:
+        """Wrap the request body as a binary stream of CSV bytes; returns ``(table_name, stream)``."""
+        params = self.query_params()
+        table_name = params.get("table", [""])[0]
+        raw: io.RawIOBase = RequestBodyReader(self.rfile, content_length)
+        if content_type.startswith("multipart/form-data"):
+            match = re.search(r'boundary="?([^";]+)"?', content_type)
+            if not match:
+                raise ValueError("multipart 缺少 boundary")
+            raw = MultipartFileReader(io.BufferedReader(raw, 65536), match.group(1))
+            table_name = table_name or raw.fields.get("table_name", "")
+        return table_name, io.BufferedReader(raw, 65536)
+
+    def handle_streaming_import(self, content_type: str, content_length: int) -> None:
+        if content_length <= 0:
+            self.send_json_response({"success": False, "error": "缺少 Content-Length 或请求体为空"})
+            return
+        table_name, body = self.open_upload(content_type, content_length)
+        if not table_name:
+            self.send_json_response({"success": False, "error": "缺少表名 (?table=)"})
+            return
+        mode = self.import_mode()
+        if self.query_flag("async"):
+            self.submit_import_job(table_name, body, mode)
+            return
+        stream = io.TextIOWrapper(body, encoding="utf-8-sig", newline="")
+        result = self.analyzer.import_stream(table_name, stream, self.import_chunk_size(), mode=mode)
+        self.send_json_response(result)
+
+    def submit_import_job(self, table_name: str, body: Any, mode: str = "append") -> None:
+        """Spool the upload to disk, queue it and answer 202 with the job id right away."""
+        if mode not in DatabaseManager.IMPORT_MODES:
+            self.send_json_response({"success": False, "error": f"mode 仅支持 {' / '.join(DatabaseManager.IMPORT_MODES)}"})
+            return
+        jobs = self.server.import_jobs
+        path, size = jobs.spool(body)
+        job = jobs.submit(table_name, path, size, self.import_chunk_size(), mode)
+        if job is None:
+            self.send_json_response({"success": False, "error": "导入队列已满，请稍后重试"}, status=503)
+            return
+        job["success"] = True
+        job["status_url"] = f"/api/data/import/{job['job_id']}"
+        self.send_json_response(job, status=202)
+
     def do_GET(self):
         if not self._check_rate_limit():
-            self.send_error(429, "Too Many Requests")
             return
         if self.path == "/":
             self.serve_html()
@@ -593,8 +3313,14 @@ class EcommerceHandler(http.server.SimpleHTTPRequestHandler):
                 return
         self.send_error(404, "未找到前端页面 (index.html / Untitled-2.html)")
 
+    def query_params(self) -> Dict[str, List[str]]:
+        return urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+
+    def query_flag(self, name: str) -> bool:
+        return self.query_params().get(name, [""])[0].lower() in ("1", "true", "yes")
+
     def handle_api_request(self) -> None:
-        path = self.path
+        path = urllib.parse.urlsplit(self.path).path
         if path == "/api/dashboard/overview":
             data = self.analyzer.get_dashboard_overview()
         elif path == "/api/sales/trend":
@@ -603,45 +3329,516 @@ class EcommerceHandler(http.server.SimpleHTTPRequestHandler):
             data = self.analyzer.get_category_analysis()
         elif path == "/api/database/info":
             data = self.analyzer.get_database_info()
+        elif path == "/api/_cache/stats":
+            data = self.analyzer.get_cache_stats()
+        elif path == "/api/_ratelimit/stats":
+            data = self.server.rate_limiter.stats()
+        elif path == "/api/_pool/stats":
+            data = self.analyzer.get_pool_stats()
+        elif path == "/api/_schema/stats":
+            data = self.analyzer.get_schema_stats()
+        elif path == "/api/_query/stats":
+            data = {**self.analyzer.get_query_stats(), "cursors": self.server.query_cursors.stats()}
+        elif path == "/api/_metrics":
+            self.send_metrics()
+            return
+        elif path == "/api/_metrics/slow":
+            if self.analyzer.metrics is None:
+                data = {"error": "未启用指标（启动时去掉 --no-metrics）"}
+            else:
+                data = self.analyzer.metrics.slow_log()
+        elif path.startswith("/api/_profile/"):
+            self.handle_profile(path.replace("/api/_profile/", ""))
+            return
+        elif path == "/api/_query/top":
+            params = self.query_params()
+            try:
+                limit = int(params.get("limit", ["20"])[0])
+            except ValueError:
+                limit = 20
+            data = self.analyzer.get_top_queries(limit, params.get("by", ["count"])[0])
         elif path == "/api/douyin/trend":
             data = self.analyzer.get_douyin_trend()
         elif path.startswith("/api/douyin/day/"):
             day = path.replace("/api/douyin/day/", "")
-            data = self.analyzer.get_day_orders(day)
+            data = self.analyzer.get_day_orders(day, stream=True)
+        elif path == "/api/orders/mismatches":
+            params = self.query_params()
+            try:
+                tolerance = float(params.get("tolerance", ["0.01"])[0])
+                limit = min(max(int(params.get("limit", ["100"])[0]), 1), 1000)
+            except ValueError:
+                self.send_json_response({"error": "tolerance / limit 格式错误"}, status=400)
+                return
+            data = self.analyzer.get_order_total_mismatches(tolerance, limit)
         elif path.startswith("/api/orders/day/"):
             day = path.replace("/api/orders/day/", "")
-            data = self.analyzer.get_order_day(day)
+            params = self.query_params()
+            try:
+                limit = int(params.get("limit", [DataAnalyzer.DAY_PAGE_SIZE])[0])
+            except ValueError:
+                self.send_json_response({"error": "limit 必须是整数"}, status=400)
+                return
+            sort = params.get("sort", ["asc"])[0]
+            if sort not in ("asc", "desc"):
+                self.send_json_response({"error": "sort 仅支持 asc / desc"}, status=400)
+                return
+            data = self.analyzer.get_day_orders_page(
+                day,
+                limit,
+                params.get("cursor", [None])[0],
+                params.get("status", [None])[0],
+                params.get("payment_method", [None])[0],
+                descending=sort == "desc",
+            )
+        elif path.startswith("/api/orders/drilldown/"):
+            day = path.replace("/api/orders/drilldown/", "")
+            data = self.analyzer.get_day_drilldown(day)
         elif path.startswith("/api/orders-stats/day/"):
             day = path.replace("/api/orders-stats/day/", "")
             data = self.analyzer.get_order_day_stats(day)
         elif path.startswith("/api/data/sample/"):
             table_name = path.replace("/api/data/sample/", "")
-            data = self.analyzer.get_sample_data(table_name)
+            data = self.analyzer.get_sample_data(table_name, stream=True)
+        elif path.startswith("/api/cursor/"):
+            data = self.server.query_cursors.fetch(self.client_ip(), path.replace("/api/cursor/", ""), self.page_size())
+            if data is None:
+                self.send_json_response({"error": "游标不存在或已过期"}, status=404)
+                return
         elif path.startswith("/api/query/"):
             query = urllib.parse.unquote(path.replace("/api/query/", ""))
-            data = self.analyzer.get_custom_query(query)
+            data = self.analyzer.get_custom_query(query, stream=True)
+        elif path.startswith("/api/export/"):
+            self.handle_export(path.replace("/api/export/", ""))
+            return
+        elif path == "/api/data/import/jobs":
+            data = self.server.import_jobs.jobs()
+        elif path.startswith("/api/data/import/"):
+            job = self.server.import_jobs.get(path.replace("/api/data/import/", ""))
+            if job is None:
+                self.send_json_response({"error": "导入任务不存在或已过期"}, status=404)
+                return
+            data = job
         else:
             data = {"error": "API not found", "path": path}
         self.send_json_response(data)
 
-    def send_json_response(self, data: Any) -> None:
+    def handle_profile(self, name: str) -> None:
+        """``latest`` lists recent profiles; ``<id>?format=txt|pstats|folded`` downloads one."""
+        profiler = self.server.profiler
+        if profiler is None or not profiler.is_trusted(self.client_ip()):
+            self.send_json_response({"error": "仅允许受信任的客户端访问性能剖析"}, status=403)
+            return
+        params = self.query_params()
+        if name == "latest":
+            try:
+                limit = int(params.get("limit", ["20"])[0])
+            except ValueError:
+                limit = 20
+            self.send_json_response(profiler.latest(max(1, min(limit, profiler.max_profiles))))
+            return
+        fmt = params.get("format", ["txt"])[0]
+        path = profiler.path(name, fmt)
+        if path is None:
+            self.send_json_response({"error": "剖析记录不存在或已被清理"}, status=404)
+            return
+        with open(path, "rb") as fh:
+            body = fh.read()
+        self.send_response(200)
+        self.send_header("Content-type", ProfileStore.FORMATS[fmt] + ("; charset=utf-8" if fmt != "pstats" else ""))
+        if fmt == "pstats":
+            self.send_header("Content-Disposition", f'attachment; filename="{name}.pstats"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_metrics(self) -> None:
+        """Prometheus text exposition of the request/SQL metrics."""
+        metrics = self.analyzer.metrics
+        if metrics is None:
+            self.send_json_response({"error": "未启用指标（启动时去掉 --no-metrics）"}, status=404)
+            return
+        body = metrics.render().encode("utf-8")
         self.send_response(200)
+        self.send_header("Content-type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_export(self, table_name: str) -> None:
+        """Stream a table as Arrow IPC (``format=arrow``, default) or Parquet, one batch per fetchmany."""
+        if pa is None:
+            self.send_json_response({"error": "导出需要安装 pyarrow"}, status=501)
+            return
+        params = self.query_params()
+        fmt = params.get("format", ["arrow"])[0]
+        if fmt not in ("arrow", "parquet"):
+            self.send_json_response({"error": "format 仅支持 arrow / parquet"}, status=400)
+            return
+        try:
+            stream, columns = self.analyzer.get_export_stream(
+                table_name, params.get("from", [None])[0], params.get("to", [None])[0]
+            )
+        except ValueError as exc:
+            self.send_json_response({"error": str(exc)}, status=400)
+            return
+
+        arrow_types = {"INTEGER": pa.int64(), "REAL": pa.float64()}
+        schema = pa.schema([(name, arrow_types.get(declared, pa.string())) for name, declared in columns])
+        try:
+            self.send_response(200)
+            if fmt == "parquet":
+                self.send_header("Content-type", "application/vnd.apache.parquet")
+            else:
+                self.send_header("Content-type", "application/vnd.apache.arrow.stream")
+            self.send_header("Content-Disposition", f'attachment; filename="{table_name}.{fmt}"')
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            sink = pa.PythonFile(self.wfile, mode="w")
+            if fmt == "parquet":
+                writer = pq.ParquetWriter(sink, schema, compression="snappy")
+            else:
+                writer = pa.ipc.new_stream(sink, schema)
+            for rows in stream.batches():
+                column_values = list(zip(*rows))
+                arrays = [arrow_column(values, field.type) for values, field in zip(column_values, schema)]
+                # Parquet: each batch becomes one row group
+                writer.write_batch(pa.record_batch(arrays, schema=schema))
+            writer.close()
+        finally:
+            stream.close()
+
+    # Responses smaller than this are not worth compressing.
+    compress_min_bytes = 1024
+    stream_flush_bytes = 64 * 1024
+
+    def _accepted_encoding(self) -> str | None:
+        """Pick br/gzip from Accept-Encoding (honouring q=0)."""
+        offered = set()
+        for part in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = part.strip().partition(";")
+            if params.replace(" ", "").lower() in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            offered.add(name.strip().lower())
+        if brotli is not None and "br" in offered:
+            return "br"
+        if "gzip" in offered:
+            return "gzip"
+        return None
+
+    def _json_dumps(self, data: Any) -> str:
+        if self.query_flag("pretty"):
+            return json.dumps(data, ensure_ascii=False, default=str, indent=2)
+        return json.dumps(data, ensure_ascii=False, default=str, separators=(",", ":"))
+
+    def send_json_response(self, data: Any, status: int = 200) -> None:
+        """Compact JSON (``?pretty=1`` for indented) with Content-Length, gzip/br when accepted."""
+        if isinstance(data, QueryStream):
+            self.send_json_stream(data, status)
+            return
+        body = self._json_dumps(data).encode("utf-8")
+        self.count_bytes(len(body))
+        encoding = self._accepted_encoding() if len(body) >= self.compress_min_bytes else None
+        if encoding == "br":
+            body = brotli.compress(body, quality=5)
+        elif encoding == "gzip":
+            body = zlib.compress(body, 6, wbits=31)
+        self.send_response(status)
         self.send_header("Content-type", "application/json; charset=utf-8")
         self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
         self.end_headers()
-        response = json.dumps(data, ensure_ascii=False, default=str, indent=2)
-        self.wfile.write(response.encode("utf-8"))
+        self.wfile.write(body)
+
+    def send_json_stream(self, stream: QueryStream, status: int = 200) -> None:
+        """Write a JSON array row by row; the body is delimited by closing the connection.
+
+        ``?format=columns`` writes ``{"columns": [...], "data": [[...], ...]}`` instead,
+        serializing each fetchmany batch of tuples in one go.
+        """
+        encoding = self._accepted_encoding()
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=5)
+            compress, flush = compressor.process, compressor.finish
+        elif encoding == "gzip":
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            compress, flush = compressor.compress, compressor.flush
+        else:
+            compress, flush = bytes, bytes
+        pretty = self.query_flag("pretty")
+        try:
+            self.send_response(status)
+            self.send_header("Content-type", "application/json; charset=utf-8")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Vary", "Accept-Encoding")
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            columns = stream.columns
+            if self.query_params().get("format", [""])[0] == "columns":
+                head = self._json_dumps({"columns": columns})
+                buffer = bytearray(head[:-1].encode("utf-8") + b',"data":[')
+                separator = b""
+                for rows in stream.batches():
+                    # a batch of tuples serializes straight to "[[...],[...]]"; drop the outer brackets
+                    buffer += separator + self._json_dumps(rows)[1:-1].encode("utf-8")
+                    separator = b","
+                    if len(buffer) >= self.stream_flush_bytes:
+                        self.count_bytes(len(buffer))
+                        self.wfile.write(compress(bytes(buffer)))
+                        buffer.clear()
+                buffer += b"]}"
+                self.count_bytes(len(buffer))
+                self.wfile.write(compress(bytes(buffer)) + flush())
+                return
+
+            buffer = bytearray(b"[")
+            separator = b""
+            for rows in stream.batches():
+                for row in rows:
+                    buffer += separator
+                    item = dict(zip(columns, row))
+                    if pretty:
+                        buffer += json.dumps(item, ensure_ascii=False, default=str, indent=2).encode("utf-8")
+                    else:
+                        buffer += json.dumps(item, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8")
+                    separator = b",\n" if pretty else b","
+                if len(buffer) >= self.stream_flush_bytes:
+                    self.count_bytes(len(buffer))
+                    self.wfile.write(compress(bytes(buffer)))
+                    buffer.clear()
+            buffer += b"]"
+            self.count_bytes(len(buffer))
+            self.wfile.write(compress(bytes(buffer)) + flush())
+        except QueryCancelledError as exc:
+            # headers are already out: closing the connection leaves the client a truncated body
+            self.log_error("%s", exc)
+        finally:
+            stream.close()
+
+
+class BoundedThreadPoolServer(socketserver.TCPServer):
+    """TCPServer that hands accepted connections to a fixed pool of worker threads.
+
+    At most ``max_queue`` connections wait for a worker; beyond that the accept loop
+    answers 503 with Retry-After (back-pressure) instead of letting latency grow
+    without bound. ``server_close`` stops accepting and drains queued requests.
+    """
+
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        server_address,
+        handler_class,
+        workers: int = 8,
+        max_queue: int = 64,
+        drain_timeout: float = 10.0,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.drain_timeout = drain_timeout
+        self.rejected_requests = 0
+        self._pending: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        super().__init__(server_address, handler_class)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"http-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def process_request(self, request, client_address) -> None:
+        try:
+            self._pending.put_nowait((request, client_address))
+        except queue.Full:
+            self.rejected_requests += 1
+            self._reject(request)
+            self.shutdown_request(request)
+
+    def _reject(self, request) -> None:
+        body = json.dumps({"error": "服务器繁忙，请稍后重试"}, ensure_ascii=False).encode("utf-8")
+        head = (
+            "HTTP/1.0 503 Service Unavailable\r\n"
+            "Retry-After: 1\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("ascii")
+        try:
+            request.settimeout(1.0)
+            request.sendall(head + body)
+        except OSError:
+            pass
+
+    def _worker_loop(self) -> None:
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def queue_depth(self) -> int:
+        return self._pending.qsize()
+
+    def server_close(self) -> None:
+        """Stop accepting, let workers finish queued requests, then join them."""
+        if self._closed:
+            return
+        self._closed = True
+        super().server_close()
+        deadline = time.monotonic() + self.drain_timeout
+        for _ in self._threads:
+            try:
+                self._pending.put(None, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def build_server(
+    port: int,
+    mode: str = "threaded",
+    workers: int = 8,
+    max_queue: int = 64,
+    drain_timeout: float = 10.0,
+    handler_class=None,
+    analyzer: DataAnalyzer | None = None,
+    rate_limiter: TokenBucketLimiter | None = None,
+    import_jobs: ImportJobManager | None = None,
+    query_cursors: CursorManager | None = None,
+    profiler: ProfileStore | None = None,
+) -> socketserver.TCPServer:
+    """Create the HTTP server; ``single`` keeps the original one-request-at-a-time loop.
+
+    The analyzer (and with it the schema bootstrap) is built here once and shared by
+    every request the server handles.
+    """
+    handler_class = handler_class or EcommerceHandler
+    if analyzer is None:
+        analyzer = DataAnalyzer(cache=ResultCache())
+    if mode == "single":
+        httpd = socketserver.TCPServer(("", port), handler_class)
+    elif mode == "threaded":
+        httpd = BoundedThreadPoolServer(
+            ("", port), handler_class, workers=workers, max_queue=max_queue, drain_timeout=drain_timeout
+        )
+    else:
+        raise ValueError(f"unknown server mode: {mode}")
+    httpd.analyzer = analyzer
+    httpd.rate_limiter = rate_limiter or TokenBucketLimiter()
+    httpd.import_jobs = import_jobs or ImportJobManager(analyzer)
+    httpd.query_cursors = query_cursors or CursorManager(analyzer)
+    httpd.profiler = profiler or ProfileStore()
+    return httpd
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="电商数据分析后台")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mode", choices=("threaded", "single"), default="threaded", help="并发模式：线程池 / 单线程")
+    parser.add_argument("--workers", type=int, default=8, help="线程池工作线程数")
+    parser.add_argument("--max-queue", type=int, default=64, help="等待队列上限，超出返回 503")
+    parser.add_argument("--drain-timeout", type=float, default=10.0, help="停止时等待排队请求完成的秒数")
+    parser.add_argument("--db", default="ecommerce.db", help="SQLite 数据库文件")
+    parser.add_argument("--pool-size", type=int, default=8, help="只读连接池大小")
+    parser.add_argument("--write-pool-size", type=int, default=2, help="读写连接池大小（导入/建表）")
+    parser.add_argument("--pool-timeout", type=float, default=5.0, help="等待空闲连接的秒数")
+    parser.add_argument("--cache-ttl", type=float, default=30.0, help="接口结果缓存的过期秒数")
+    parser.add_argument("--cache-size", type=int, default=256, help="接口结果缓存条目上限 (LRU)")
+    parser.add_argument("--rate-limit", type=int, default=120, help="每个 IP 在一个窗口内允许的请求数")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="限流窗口秒数")
+    parser.add_argument("--import-queue", type=int, default=16, help="排队中的后台导入任务上限，超出返回 503")
+    parser.add_argument("--import-history", type=int, default=100, help="保留的已完成导入任务数")
+    parser.add_argument("--query-timeout", type=float, default=5.0, help="自定义 SQL 的执行时间上限（秒，0 为不限）")
+    parser.add_argument("--query-max-steps", type=int, default=200_000_000, help="自定义 SQL 的虚拟机指令数上限（0 为不限）")
+    parser.add_argument(
+        "--query-max-scan-rows", type=int, default=10_000_000, help="多表全表扫描的估算行数上限，超出直接拒绝（0 为不检查）"
+    )
+    parser.add_argument("--query-cache-size", type=int, default=256, help="缓存的自定义 SQL 语句数（LRU，含结果集）")
+    parser.add_argument("--cursor-ttl", type=float, default=60.0, help="SQL 游标空闲多少秒后自动关闭")
+    parser.add_argument("--cursor-limit", type=int, default=4, help="每个客户端同时打开的 SQL 游标上限")
+    parser.add_argument("--max-cursors", type=int, default=64, help="全服务器同时打开的 SQL 游标上限")
+    parser.add_argument("--no-metrics", action="store_true", help="关闭 /api/_metrics 的请求与 SQL 计时")
+    parser.add_argument("--slow-query-ms", type=float, default=200.0, help="慢查询阈值（毫秒），超过的 SQL 连同执行计划记入慢查询日志")
+    parser.add_argument("--slow-log-size", type=int, default=50, help="慢查询日志保留条数")
+    parser.add_argument("--profile-dir", default="profiles", help="请求剖析文件目录")
+    parser.add_argument("--profile-keep", type=int, default=50, help="保留的请求剖析份数（超出删除最旧的）")
+    parser.add_argument(
+        "--profile-trusted",
+        default="127.0.0.1/32,::1/128",
+        help="允许用 X-Profile / ?profile= 开启剖析的客户端网段，逗号分隔；留空则关闭",
+    )
+    parser.add_argument("--rebuild-rollup", action="store_true", help="全量重建 daily_order_rollup 后退出")
+    return parser.parse_args(argv)
 
 
-def main() -> None:
-    port = 8000
-    with socketserver.TCPServer(("", port), EcommerceHandler) as httpd:
+def main(argv: List[str] | None = None) -> None:
+    args = parse_args(argv)
+    port = args.port
+    # 先以命令行参数创建进程级连接池，之后的 DatabaseManager 复用它
+    get_connection_pool(args.db, size=args.write_pool_size, wait_timeout=args.pool_timeout)
+    get_connection_pool(args.db, size=args.pool_size, wait_timeout=args.pool_timeout, read_only=True)
+    if args.rebuild_rollup:
+        result = DatabaseManager(args.db).rebuild_rollup()
+        print(f"✅ daily_order_rollup 已重建: {result['days']} 天, 用时 {result['seconds']}s")
+        return
+    # 建表/迁移只在启动时做一次，之后所有请求共用同一个 DataAnalyzer
+    query_guard = QueryGuard(args.query_timeout, args.query_max_steps, args.query_max_scan_rows)
+    analyzer = DataAnalyzer(
+        args.db,
+        cache=ResultCache(max_entries=args.cache_size, ttl=args.cache_ttl),
+        query_guard=query_guard,
+        query_cache=QueryCache(max_entries=args.query_cache_size, ttl=args.cache_ttl),
+        metrics=None if args.no_metrics else Metrics(args.slow_query_ms, args.slow_log_size),
+    )
+    limiter = TokenBucketLimiter(args.rate_limit, args.rate_window)
+    import_jobs = ImportJobManager(analyzer, max_pending=args.import_queue, max_history=args.import_history)
+    query_cursors = CursorManager(
+        analyzer, ttl=args.cursor_ttl, max_per_client=args.cursor_limit, max_cursors=args.max_cursors
+    )
+    trusted = [network.strip() for network in args.profile_trusted.split(",") if network.strip()]
+    profiler = ProfileStore(args.profile_dir, args.profile_keep, trusted)
+    with build_server(
+        port,
+        args.mode,
+        args.workers,
+        args.max_queue,
+        args.drain_timeout,
+        analyzer=analyzer,
+        rate_limiter=limiter,
+        import_jobs=import_jobs,
+        query_cursors=query_cursors,
+        profiler=profiler,
+    ) as httpd:
         print(f"✅ 服务器已启动: http://localhost:{port}")
         print("功能: 仪表盘 / 销售趋势 / 品类分析 / SQL 查询 / CSV 导入")
+        if args.mode == "threaded":
+            print(f"并发: {args.workers} 个工作线程，等待队列上限 {args.max_queue}")
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
-            print("\n🛑 服务器已停止")
+            print("\n🛑 正在停止，等待排队中的请求完成...")
+    import_jobs.close()
+    query_cursors.close()
+    print("🛑 服务器已停止")
 
 
 if __name__ == "__main__":
@@ -49,6 +49,65 @@ def create_tables(cur):
     )
 
 
+def rebuild_rollup(cur):
+    """Recompute the dashboard's daily rollup tables (same layout as DatabaseManager)."""
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS daily_order_rollup (
+            day TEXT NOT NULL,
+            status TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            order_count INTEGER NOT NULL,
+            sales_total REAL NOT NULL,
+            PRIMARY KEY (day, status, payment_method)
+        ) WITHOUT ROWID"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS daily_order_customers (
+            day TEXT NOT NULL,
+            cancelled INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            order_count INTEGER NOT NULL,
+            PRIMARY KEY (day, cancelled, user_id)
+        ) WITHOUT ROWID"""
+    )
+    cur.execute("DELETE FROM daily_order_rollup")
+    cur.execute("DELETE FROM daily_order_customers")
+    cur.execute(
+        """INSERT INTO daily_order_rollup (day, status, payment_method, order_count, sales_total)
+        SELECT DATE(order_date), IFNULL(status, ''), IFNULL(payment_method, ''), COUNT(*), COALESCE(SUM(total_amount), 0)
+        FROM orders WHERE DATE(order_date) IS NOT NULL
+        GROUP BY 1, 2, 3"""
+    )
+    cur.execute(
+        """INSERT INTO daily_order_customers (day, cancelled, user_id, order_count)
+        SELECT DATE(order_date), IFNULL(status, '') = 'cancelled', user_id, COUNT(*)
+        FROM orders WHERE DATE(order_date) IS NOT NULL AND user_id IS NOT NULL
+        GROUP BY 1, 2, 3"""
+    )
+
+
+def rebuild_item_summary(cur):
+    """Recompute per-order item count / revenue / categories (same layout as DatabaseManager)."""
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS order_item_summary (
+            order_id INTEGER PRIMARY KEY,
+            item_count INTEGER NOT NULL,
+            item_quantity INTEGER NOT NULL,
+            item_revenue REAL NOT NULL,
+            categories TEXT
+        )"""
+    )
+    cur.execute("DELETE FROM order_item_summary")
+    cur.execute(
+        """INSERT INTO order_item_summary (order_id, item_count, item_quantity, item_revenue, categories)
+        SELECT oi.order_id, COUNT(*), COALESCE(SUM(oi.quantity), 0), COALESCE(SUM(oi.quantity * oi.unit_price), 0),
+               GROUP_CONCAT(DISTINCT p.category)
+        FROM order_items oi LEFT JOIN products p ON oi.product_id = p.product_id
+        WHERE oi.order_id IS NOT NULL
+        GROUP BY oi.order_id"""
+    )
+
+
 def seed_users(cur, n=120):
     cur.execute("DELETE FROM users")
     for i in range(1, n + 1):
@@ -145,6 +204,8 @@ def main():
     start = date.today() - timedelta(days=120)
     end = date.today()
     seed_orders(cur, start, end)
+    rebuild_rollup(cur)
+    rebuild_item_summary(cur)
     conn.commit()
     conn.close()
     print(f"Reseeded users/products/orders/order_items with data from {start} to {end}")
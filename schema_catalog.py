@@ -0,0 +1,83 @@
+"""Schema introspection cache shared by the http.server app and the Flask API.
+
+Both backends used to run ``PRAGMA table_info`` on every request. A SchemaCatalog
+loads the table list and columns once per database file and reloads them only when
+``PRAGMA schema_version`` changes (SQLite bumps it on every CREATE/ALTER/DROP, from
+any connection or process), so a lookup costs one cheap PRAGMA.
+
+The catalog does not own a connection: callers pass ``execute(sql) -> rows`` built on
+whatever they already hold (a sqlite3 connection, a SQLAlchemy session, ...).
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Sequence
+
+Execute = Callable[[str], Sequence[Sequence[Any]]]
+
+# PRAGMA table_info column order
+TABLE_INFO_FIELDS = ("cid", "name", "type", "notnull", "dflt_value", "pk")
+
+
+class SchemaCatalog:
+    """Tables and columns of one SQLite database, cached per ``schema_version``."""
+
+    def __init__(self) -> None:
+        self.version: int | None = None
+        self._tables: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.lookups = 0
+
+    def tables(self, execute: Execute) -> Dict[str, List[Dict[str, Any]]]:
+        """``{table: [column dicts as PRAGMA table_info]}``, reloaded if the schema changed."""
+        version = execute("PRAGMA schema_version")[0][0]
+        with self._lock:
+            self.lookups += 1
+            if version == self.version:
+                return self._tables
+        tables: Dict[str, List[Dict[str, Any]]] = {}
+        names = [row[0] for row in execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY rowid")]
+        for name in names:
+            quoted = name.replace('"', '""')
+            tables[name] = [dict(zip(TABLE_INFO_FIELDS, row)) for row in execute(f'PRAGMA table_info("{quoted}")')]
+        with self._lock:
+            # a concurrent reload may have won; either result matches ``version``
+            self._tables = tables
+            self.version = version
+            self.loads += 1
+        return tables
+
+    def table_names(self, execute: Execute) -> List[str]:
+        return list(self.tables(execute))
+
+    def columns(self, execute: Execute, table: str) -> List[Dict[str, Any]]:
+        """Column dicts of ``table``; empty when it does not exist."""
+        return self.tables(execute).get(table, [])
+
+    def column_names(self, execute: Execute, table: str) -> List[str]:
+        return [column["name"] for column in self.columns(execute, table)]
+
+    def primary_key(self, execute: Execute, table: str) -> str | None:
+        for column in self.columns(execute, table):
+            if column["pk"]:
+                return column["name"]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"schema_version": self.version, "tables": len(self._tables), "loads": self.loads, "lookups": self.lookups}
+
+
+_CATALOGS: Dict[str, SchemaCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def get_schema_catalog(db_path: str) -> SchemaCatalog:
+    """Process-wide catalog for ``db_path`` (one per database file)."""
+    key = os.path.abspath(db_path)
+    with _CATALOGS_LOCK:
+        catalog = _CATALOGS.get(key)
+        if catalog is None:
+            catalog = _CATALOGS[key] = SchemaCatalog()
+        return catalog